@@ -0,0 +1,356 @@
+"""
+Benchmark / load test ของ Election Backend
+
+สร้างการเลือกตั้งจำลองขนาดเท่าไหร่ก็ได้ (ภาค, เขต, พรรค, ผู้สมัคร, ผู้มีสิทธิ)
+แล้วยิง traffic ลงคะแนน + ดึงผล วัด p50/p95/p99 ต่อ endpoint และ ballots/sec
+ผลลัพธ์เขียนเป็น JSON เพื่อเทียบ regression ข้ามแต่ละ commit
+
+ตัวอย่าง:
+    python bench.py                                   # in-process, db ชั่วคราว
+    python bench.py --constituencies 400 --voters 50000 --batch-size 500
+    python bench.py --replay client.http              # เล่นซ้ำ scenario ใน client.http
+    python bench.py --base-url http://127.0.0.1:8000  # ยิง server ที่รันอยู่จริง
+"""
+import argparse
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+
+READ_ENDPOINTS = [
+    "/ballots/summary",
+    "/results/constituency",
+    "/results/party",
+    "/results/constituency/overall",
+    "/results/party/overall",
+]
+
+
+# =========================
+# Recorder
+# =========================
+
+class Recorder:
+    """เก็บ latency ต่อ endpoint (thread-safe)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def call(self, client, method: str, path: str, label: str | None = None, **kwargs):
+        label = label or f"{method} {path.split('?')[0]}"
+        start = time.perf_counter()
+        response = client.request(method, path, **kwargs)
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self.samples[label].append(elapsed)
+            if response.status_code >= 500:
+                self.errors[label] += 1
+        return response
+
+    def report(self, wall_seconds: float) -> dict:
+        out = {}
+        for label, samples in sorted(self.samples.items()):
+            ordered = sorted(samples)
+            out[label] = {
+                "requests": len(ordered),
+                "errors": self.errors[label],
+                "mean_ms": statistics.fmean(ordered) * 1000,
+                "p50_ms": _percentile(ordered, 50) * 1000,
+                "p95_ms": _percentile(ordered, 95) * 1000,
+                "p99_ms": _percentile(ordered, 99) * 1000,
+                "max_ms": ordered[-1] * 1000,
+                "req_per_sec": len(ordered) / wall_seconds if wall_seconds else 0.0,
+            }
+        return out
+
+
+def _percentile(ordered: list, pct: float) -> float:
+    # nearest-rank
+    if not ordered:
+        return 0.0
+    rank = max(1, round(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+# =========================
+# Synthetic election
+# =========================
+
+def setup_election(client, rec: Recorder, args, rng: random.Random) -> dict:
+    """สร้าง ภาค/เขต/พรรค/ผู้สมัคร/ผู้มีสิทธิ ผ่าน API แล้วคืน id ที่ได้"""
+    region_ids = []
+    for i in range(args.regions):
+        r = rec.call(client, "POST", "/regions", json={
+            "name_th": f"ภาค {i + 1}", "total_population": args.voters,
+        })
+        region_ids.append(r.json()["region_id"])
+
+    const_ids = []
+    for i in range(args.constituencies):
+        r = rec.call(client, "POST", "/constituencies", json={
+            "region_id": region_ids[i % len(region_ids)],
+            "const_number": i + 1,
+            "total_eligible_voters": args.voters // args.constituencies,
+        })
+        const_ids.append(r.json()["const_id"])
+
+    party_ids = []
+    for i in range(args.parties):
+        r = rec.call(client, "POST", "/parties", json={"party_name": f"พรรคทดสอบ {i + 1}"})
+        party_ids.append(r.json()["party_id"])
+
+    # ความนิยมแบบ Zipf: พรรคต้น ๆ ได้คะแนนมากกว่า
+    popularity = [1 / (rank + 1) for rank in range(len(party_ids))]
+
+    candidates = {}  # const_id -> [(candidate_id, party_weight)]
+    per_const = min(args.candidates_per_const, len(party_ids))
+    for const_id in const_ids:
+        chosen = rng.sample(range(len(party_ids)), per_const)
+        candidates[const_id] = []
+        for number, p in enumerate(chosen, start=1):
+            r = rec.call(client, "POST", "/candidates", json={
+                "const_id": const_id,
+                "party_id": party_ids[p],
+                "candidate_number": number,
+                "full_name": f"ผู้สมัคร {const_id}-{number}",
+            })
+            candidates[const_id].append((r.json()["candidate_id"], popularity[p]))
+
+    voters = []  # (voter_id, const_id)
+    for i in range(args.voters):
+        const_id = const_ids[i % len(const_ids)]
+        r = rec.call(client, "POST", "/voters", json={
+            "citizen_id": f"{args.seed:04d}{i:09d}",
+            "full_name": f"ผู้มีสิทธิ {i + 1}",
+            "const_id": const_id,
+        })
+        voters.append((r.json()["voter_id"], const_id))
+
+    return {
+        "party_ids": party_ids,
+        "popularity": popularity,
+        "candidates": candidates,
+        "voters": voters,
+    }
+
+
+def generate_ballots(election: dict, args, rng: random.Random) -> list:
+    """ผู้มีสิทธิแต่ละคนลง 2 ใบ (เขต + บัญชีรายชื่อ) บางส่วนเป็นบัตรเสีย"""
+    ballots = []
+    for voter_id, const_id in election["voters"]:
+        if rng.random() >= args.turnout:
+            continue
+
+        if rng.random() < args.spoiled_rate:
+            ballots.append({"voter_id": voter_id, "const_id": const_id, "vote_type": "Constituency"})
+        else:
+            ids, weights = zip(*election["candidates"][const_id])
+            ballots.append({
+                "voter_id": voter_id, "const_id": const_id, "vote_type": "Constituency",
+                "candidate_id": rng.choices(ids, weights)[0],
+            })
+
+        if rng.random() < args.spoiled_rate:
+            ballots.append({"voter_id": voter_id, "const_id": const_id, "vote_type": "PartyList"})
+        else:
+            ballots.append({
+                "voter_id": voter_id, "const_id": const_id, "vote_type": "PartyList",
+                "party_id": rng.choices(election["party_ids"], election["popularity"])[0],
+            })
+
+    rng.shuffle(ballots)
+    return ballots
+
+
+def run_ballots(client, rec: Recorder, ballots: list, args) -> float:
+    """ยิงบัตรทั้งหมด (ทีละใบหรือเป็น batch) + แทรกการดึงผลเป็นระยะ คืนเวลาที่ใช้"""
+    if args.batch_size > 1:
+        jobs = [("POST", "/ballots/batch", ballots[i:i + args.batch_size])
+                for i in range(0, len(ballots), args.batch_size)]
+    else:
+        jobs = [("POST", "/ballots", b) for b in ballots]
+
+    # dashboard polling ระหว่างลงคะแนน
+    if args.read_every:
+        mixed = []
+        for i, job in enumerate(jobs, start=1):
+            mixed.append(job)
+            if i % args.read_every == 0:
+                mixed.append(("GET", READ_ENDPOINTS[(i // args.read_every) % len(READ_ENDPOINTS)], None))
+        jobs = mixed
+
+    def send(job):
+        method, path, body = job
+        if body is None:
+            rec.call(client, method, path)
+        else:
+            rec.call(client, method, path, json=body)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(send, jobs))
+    return time.perf_counter() - start
+
+
+def run_reads(client, rec: Recorder, args) -> None:
+    for _ in range(args.read_rounds):
+        for path in READ_ENDPOINTS:
+            rec.call(client, "GET", path)
+
+
+# =========================
+# Replay (.http / .jsonl)
+# =========================
+
+_HTTP_REQUEST_LINE = re.compile(r"^(GET|POST|PUT|PATCH|DELETE)\s+\{\{baseUrl\}\}(\S+)")
+
+
+def load_replay(path: str) -> list:
+    """
+    อ่าน request จากไฟล์
+    - .http  : รูปแบบ REST Client (เช่น client.http) คั่นด้วย ###
+    - .jsonl : บรรทัดละ {"method": ..., "path": ..., "json": ...}
+    """
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+
+    if path.endswith(".jsonl"):
+        out = []
+        for line in text.splitlines():
+            if line.strip():
+                item = json.loads(line)
+                out.append((item["method"].upper(), item["path"], item.get("json")))
+        return out
+
+    out = []
+    for block in text.split("###"):
+        lines = block.strip("\n").splitlines()
+        for i, line in enumerate(lines):
+            m = _HTTP_REQUEST_LINE.match(line.strip())
+            if not m:
+                continue
+            # body = ทุกอย่างหลังบรรทัดว่างแรกถัดจาก header
+            rest = lines[i + 1:]
+            body_lines = []
+            if "" in [l.strip() for l in rest]:
+                blank = [l.strip() for l in rest].index("")
+                body_lines = [l for l in rest[blank + 1:] if not l.lstrip().startswith("#")]
+            body = "\n".join(body_lines).strip()
+            out.append((m.group(1), m.group(2), json.loads(body) if body else None))
+            break
+    return out
+
+
+def run_replay(client, rec: Recorder, requests: list, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for method, path, body in requests:
+            if body is None:
+                rec.call(client, method, path)
+            else:
+                rec.call(client, method, path, json=body)
+    return time.perf_counter() - start
+
+
+# =========================
+# Main
+# =========================
+
+def make_client(args):
+    if args.base_url:
+        import httpx
+        return httpx.Client(base_url=args.base_url, timeout=60)
+
+    # in-process: ใช้ db ชั่วคราว (ต้องตั้ง env ก่อน import main/database)
+    if args.db:
+        db_path = args.db
+    else:
+        fd, db_path = tempfile.mkstemp(prefix="election-bench-", suffix=".db")
+        os.close(fd)
+        os.unlink(db_path)
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+
+    from fastapi.testclient import TestClient
+    import main
+
+    return TestClient(main.app)
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Election backend benchmark")
+    p.add_argument("--base-url", help="ยิง server จริง (ไม่ระบุ = รันในโปรเซสเดียวกันด้วย db ชั่วคราว)")
+    p.add_argument("--db", help="ไฟล์ sqlite สำหรับโหมด in-process (ไม่ระบุ = temp file)")
+    p.add_argument("--regions", type=int, default=4)
+    p.add_argument("--constituencies", type=int, default=20)
+    p.add_argument("--parties", type=int, default=8)
+    p.add_argument("--candidates-per-const", type=int, default=6)
+    p.add_argument("--voters", type=int, default=2000)
+    p.add_argument("--turnout", type=float, default=0.75)
+    p.add_argument("--spoiled-rate", type=float, default=0.03)
+    p.add_argument("--batch-size", type=int, default=1, help=">1 = ใช้ POST /ballots/batch")
+    p.add_argument("--concurrency", type=int, default=1)
+    p.add_argument("--read-every", type=int, default=50, help="แทรก GET ผลคะแนนทุก N request (0 = ปิด)")
+    p.add_argument("--read-rounds", type=int, default=20)
+    p.add_argument("--replay", help="เล่นซ้ำ request จากไฟล์ .http หรือ .jsonl แทน scenario สังเคราะห์")
+    p.add_argument("--repeat", type=int, default=1, help="จำนวนรอบของ --replay")
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--out", default="bench_results.json")
+    return p.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    rng = random.Random(args.seed)
+    rec = Recorder()
+    result = {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "config": vars(args),
+    }
+
+    with make_client(args) as client:
+        wall_start = time.perf_counter()
+
+        if args.replay:
+            requests = load_replay(args.replay)
+            result["replay_seconds"] = run_replay(client, rec, requests, args.repeat)
+        else:
+            election = setup_election(client, rec, args, rng)
+            ballots = generate_ballots(election, args, rng)
+            ballot_seconds = run_ballots(client, rec, ballots, args)
+            run_reads(client, rec, args)
+
+            result["ballots"] = len(ballots)
+            result["ballot_seconds"] = ballot_seconds
+            result["ballots_per_sec"] = len(ballots) / ballot_seconds if ballot_seconds else 0.0
+
+        wall = time.perf_counter() - wall_start
+
+    result["wall_seconds"] = wall
+    result["endpoints"] = rec.report(wall)
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+    print(f"{'endpoint':<40}{'n':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'err':>6}")
+    for label, s in result["endpoints"].items():
+        print(f"{label:<40}{s['requests']:>8}{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}{s['p99_ms']:>10.2f}{s['errors']:>6}")
+    if "ballots_per_sec" in result:
+        print(f"\nballots: {result['ballots']}  ballots/sec: {result['ballots_per_sec']:.1f}")
+    print(f"written: {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
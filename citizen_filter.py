@@ -0,0 +1,190 @@
+import hashlib
+import math
+import os
+import threading
+import time
+from typing import Iterable, Optional
+
+from sqlmodel import Session, select, func
+
+from models import Voter
+
+
+# =========================
+# Negative-lookup filter ของ citizen_id (Bloom filter)
+# =========================
+# ตอบ "ไม่มีแน่นอน" ได้โดยไม่แตะ db -> จุดตรวจสิทธิ์ปฏิเสธเลขที่ไม่มีในทะเบียนได้ทันที
+# ตอบ "อาจมี" -> ไปถาม db ตามปกติ (false positive ~ ERROR_RATE)
+#
+# filter อยู่ใน process นี้ แต่ "ไม่มีแน่นอน" ต้องไม่ผิด (false negative = 404 ให้คนที่มีสิทธิ)
+# - ทุกการ insert voter เพิ่มตัวนับ ResultsVersions "voters" ใน transaction เดียวกัน (ทุก process)
+# - filter จำตัวนับตอน build + นับ add() ของ process นี้หลังจากนั้น (POST /voters, /voters/import ทีละ chunk)
+# - thread เบื้องหลังอ่านตัวนับทุก POLL_INTERVAL (request ไม่อ่านเอง -> เลขที่ไม่มีจริงไม่แตะ db เลย)
+# - เชื่อ "ไม่มี" เฉพาะตอนค่าที่ poll ล่าสุด = ตอน build + add ของเรา (ไม่มีใครเขียนที่ filter ไม่รู้)
+#   ไม่ตรง (worker อื่น / CLI เขียน) -> ค้น db ตามปกติ และ rebuild (ห่างกันอย่างน้อย REBUILD_INTERVAL)
+#   insert จาก process อื่นอาจยังถูกตอบ "ไม่มี" ได้ไม่เกิน ~POLL_INTERVAL (จนกว่า poll รอบถัดไปจะเห็น)
+# - poll ค้าง/ล้ม (เกิน POLL_INTERVAL * 3) -> ไม่เชื่อ filter จนกว่าจะ poll ได้อีก
+# - ยังไม่มี filter / หลัง invalidate() -> ค้น db ตามปกติ (ไม่ block request)
+
+ERROR_RATE = float(os.getenv("CITIZEN_FILTER_ERROR_RATE", "0.001"))
+REBUILD_INTERVAL = float(os.getenv("CITIZEN_FILTER_REBUILD_SECONDS", "60"))
+POLL_INTERVAL = float(os.getenv("CITIZEN_FILTER_POLL_SECONDS", "1"))
+MIN_CAPACITY = 100_000
+BUILD_FETCH_SIZE = 10_000
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float = ERROR_RATE):
+        capacity = max(capacity, 1)
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        # double hashing: h1 + i*h2 จาก blake2b ครั้งเดียว
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item: str) -> None:
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+_filter: Optional[BloomFilter] = None
+_built_version = 0  # ตัวนับ "voters" ใน db ตอนเริ่ม build _filter
+_own_adds = 0  # จำนวน add() หลังเริ่ม build _filter (insert ของ process นี้)
+_built_at = 0.0
+_building = False
+_polled_version: Optional[int] = None  # ตัวนับ "voters" ที่ poll ได้ล่าสุด
+_polled_at = 0.0
+_polling = False
+_added_during_build: list = []
+_lock = threading.Lock()
+
+
+def _read_version() -> int:
+    import sharding
+    import tally
+
+    return sum(sharding.scatter(tally.voters_version))
+
+
+def _poll() -> None:
+    global _polled_version, _polled_at
+    while True:
+        try:
+            version = _read_version()
+        except Exception:
+            version = None  # db มีปัญหา -> ไม่เชื่อ filter
+        with _lock:
+            _polled_version = version
+            _polled_at = time.monotonic()
+        time.sleep(POLL_INTERVAL)
+
+
+def _ensure_polling() -> None:
+    global _polling
+    with _lock:
+        if _polling:
+            return
+        _polling = True
+    threading.Thread(target=_poll, name="citizen-filter-poll", daemon=True).start()
+
+
+def _build() -> None:
+    global _filter, _built_version, _own_adds, _built_at, _building
+    import sharding
+
+    try:
+        # อ่านตัวนับก่อน scan: insert ที่ commit ก่อนนี้อยู่ใน scan แน่นอน
+        # insert หลังจากนี้ต้องมาทาง add() (_added_during_build) ไม่งั้นตัวนับไม่ตรง -> ไม่ถูกเชื่อ
+        with _lock:
+            _added_during_build.clear()
+        version = _read_version()
+
+        engines = sharding.data_engines()
+        # max(voter_id) ใช้ PK index (ไม่ scan) -> ประมาณจำนวนแถว + เผื่อโต 2 เท่า
+        estimate = 0
+        for index, engine in enumerate(engines):
+            with Session(engine) as session:
+                max_id = session.exec(select(func.max(Voter.voter_id))).one()
+            if max_id is not None:
+                estimate += max_id - sharding.id_base(index)
+
+        bloom = BloomFilter(max(MIN_CAPACITY, estimate * 2))
+        statement = select(Voter.citizen_id).execution_options(yield_per=BUILD_FETCH_SIZE)
+        for engine in engines:
+            with Session(engine) as session:
+                for citizen_id in session.exec(statement):
+                    bloom.add(citizen_id)
+
+        with _lock:
+            for citizen_id in _added_during_build:
+                bloom.add(citizen_id)
+            _filter = bloom
+            _built_version = version
+            _own_adds = len(_added_during_build)
+            _built_at = time.monotonic()
+    finally:
+        with _lock:
+            _building = False
+            _added_during_build.clear()
+
+
+def _ensure_fresh(in_sync: bool) -> None:
+    global _building
+    with _lock:
+        if _building:
+            return
+        if _filter is not None and (in_sync or time.monotonic() - _built_at < REBUILD_INTERVAL):
+            return
+        _building = True
+    threading.Thread(target=_build, name="citizen-filter-build", daemon=True).start()
+
+
+def absent(citizen_ids: Iterable[str]) -> set:
+    """
+    citizen_id ที่ไม่มีในทะเบียนแน่นอน (ไม่แตะ db)
+    filter ยังไม่พร้อม / ตามไม่ทัน -> set ว่าง (ค้น db ทุกตัว)
+    """
+    _ensure_polling()
+    with _lock:
+        current, expected = _filter, _built_version + _own_adds
+        polled, polled_at = _polled_version, _polled_at
+    in_sync = (
+        current is not None
+        and polled == expected
+        and time.monotonic() - polled_at < POLL_INTERVAL * 3
+    )
+    _ensure_fresh(in_sync)
+    if not in_sync:
+        return set()
+    return {c for c in citizen_ids if c not in current}
+
+
+def add(citizen_id: str) -> None:
+    """เรียกหลัง commit voter ใหม่ (ตัวนับ "voters" ใน db เพิ่มไปแล้ว 1)"""
+    add_many([citizen_id])
+
+
+def add_many(citizen_ids: Iterable[str]) -> None:
+    global _own_adds
+    with _lock:
+        for citizen_id in citizen_ids:
+            if _filter is not None:
+                _filter.add(citizen_id)
+                _own_adds += 1
+            if _building:
+                _added_during_build.append(citizen_id)
+
+
+def invalidate() -> None:
+    """ทิ้ง filter ทันที -> ค้น db ตรง ๆ จนกว่า rebuild จะเสร็จ"""
+    global _filter
+    with _lock:
+        _filter = None
@@ -0,0 +1,186 @@
+import os
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # optional: pip install brotli
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional: pip install zstandard
+    zstandard = None
+
+
+# =========================
+# Response compression (gzip / br / zstd)
+# =========================
+# เลือก encoding จาก Accept-Encoding ของ client (q-value) + ที่ server มี
+# - body เล็กกว่า MINIMUM_SIZE (ส่งครั้งเดียว) -> ไม่บีบ
+# - StreamingResponse (NDJSON export) -> บีบทีละ chunk ไม่ต้องเก็บทั้ง body ใน memory
+# - text/event-stream ไม่บีบ (compressor จะกัก event ไว้จน client ไม่เห็นผลสด)
+
+MINIMUM_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+ZSTD_LEVEL = int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3"))
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/x-ndjson", "application/xml")
+SKIP_TYPES = ("text/event-stream",)
+
+
+def available_encodings() -> tuple:
+    """ลำดับที่ server อยากใช้ (ratio/ความเร็วดีสุดก่อน)"""
+    encodings = []
+    if zstandard is not None:
+        encodings.append("zstd")
+    if brotli is not None:
+        encodings.append("br")
+    encodings.append("gzip")
+    return tuple(encodings)
+
+
+def negotiate(accept_encoding: str, encodings: tuple) -> str | None:
+    """
+    Accept-Encoding: "gzip;q=0.8, br, *;q=0" -> encoding ที่ q สูงสุด (เท่ากันใช้ลำดับของ server)
+    ไม่มีตัวไหนรับได้ -> None (ส่งแบบไม่บีบ)
+    """
+    q_values = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        q_values[name.strip()] = q
+
+    wildcard = q_values.get("*", 0.0)
+    best, best_q = None, 0.0
+    for encoding in encodings:
+        q = q_values.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class _Encoder:
+    def __init__(self, encoding: str):
+        if encoding == "gzip":
+            compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # wbits 31 = gzip header
+            self._compress, self._finish = compressor.compress, compressor.flush
+        elif encoding == "br":
+            compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+            self._compress, self._finish = compressor.process, compressor.finish
+        elif encoding == "zstd":
+            compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+            self._compress, self._finish = compressor.compress, compressor.flush
+        else:
+            raise ValueError(f"Unsupported encoding: {encoding!r}")
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compress(data) if data else b""
+
+    def finish(self) -> bytes:
+        return self._finish()
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = MINIMUM_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.encodings = available_encodings()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""), self.encodings)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _Responder(send, encoding, self.minimum_size)
+        await self.app(scope, receive, responder.send)
+
+
+def _weaken_etag(headers: MutableHeaders) -> None:
+    # representation เปลี่ยน -> ETag แบบ weak (respcache รับ W/"..." ใน If-None-Match อยู่แล้ว)
+    etag = headers.get("etag")
+    if etag and not etag.startswith("W/"):
+        headers["ETag"] = "W/" + etag
+
+
+class _Responder:
+    def __init__(self, send, encoding: str, minimum_size: int):
+        self._send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start_message = None
+        self.encoder = None
+        self.passthrough = False
+
+    def _should_compress(self, headers: MutableHeaders) -> bool:
+        if "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "").lower()
+        if content_type.startswith(SKIP_TYPES):
+            return False
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+    async def send(self, message) -> None:
+        kind = message["type"]
+
+        if kind == "http.response.start":
+            # รอ body ก้อนแรกก่อน ถึงจะรู้ว่าควรบีบไหม
+            self.start_message = message
+            return
+
+        if kind != "http.response.body" or self.passthrough:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.encoder is None:
+            headers = MutableHeaders(raw=self.start_message["headers"])
+            if self.start_message["status"] == 304:
+                # 304 ใช้ ETag รูปแบบเดียวกับ 200 ที่ถูกบีบ (weak)
+                _weaken_etag(headers)
+
+            if not self._should_compress(headers) or (not more_body and len(body) < self.minimum_size):
+                self.passthrough = True
+                await self._send(self.start_message)
+                await self._send(message)
+                return
+
+            self.encoder = _Encoder(self.encoding)
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            _weaken_etag(headers)
+
+            if not more_body:
+                # body ครบในก้อนเดียว -> ใส่ Content-Length ของข้อมูลที่บีบแล้ว
+                compressed = self.encoder.compress(body) + self.encoder.finish()
+                headers["Content-Length"] = str(len(compressed))
+                await self._send(self.start_message)
+                await self._send({"type": "http.response.body", "body": compressed})
+                return
+
+            del headers["Content-Length"]
+            await self._send(self.start_message)
+
+        data = self.encoder.compress(body)
+        if not more_body:
+            data += self.encoder.finish()
+        # compressor ยังกักข้อมูลไว้ (chunk เล็ก เช่น NDJSON ทีละบรรทัด) -> ไม่ต้องส่งก้อนว่าง
+        if data or not more_body:
+            await self._send({"type": "http.response.body", "body": data, "more_body": more_body})
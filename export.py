@@ -0,0 +1,286 @@
+"""
+Export ตาราง Ballots เป็น Apache Arrow IPC (stream) หรือ Parquet สำหรับงานวิเคราะห์
+
+    python export.py ballots.parquet
+    python export.py ballots.arrow --batch-size 200000
+
+อ่าน Ballots เป็นชุด (record batch) จาก cursor -> แปลงเป็นคอลัมน์ทีละชุด
+ชื่อเขต/ภาค/ผู้สมัคร/พรรค ผูกจาก refcache ด้วย pyarrow.compute (ไม่มี loop ต่อแถว)
+คอลัมน์ชื่อเป็น dictionary array -> ไฟล์เล็ก โหลดเข้า pandas ได้เป็น categorical
+ไม่มี voter_id (บัตรเป็นแบบไม่ระบุตัวตน เหมือน GET /ballots)
+
+ต้องติดตั้ง pyarrow (optional: pip install pyarrow)
+"""
+import argparse
+import sys
+import time
+from typing import Iterator, Optional
+
+from sqlalchemy import String, type_coerce
+from sqlmodel import Session, select
+
+from models import Ballot
+import refcache
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+
+DEFAULT_BATCH_SIZE = 65_536
+FORMATS = ("arrow", "parquet")
+MEDIA_TYPES = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+PARQUET_COMPRESSION = "zstd"
+
+
+def available() -> bool:
+    return pa is not None
+
+
+def _name_type():
+    return pa.dictionary(pa.int32(), pa.string())
+
+
+def schema():
+    return pa.schema([
+        ("ballot_id", pa.int64()),
+        ("const_id", pa.int64()),
+        ("const_number", pa.int64()),
+        ("region_name", _name_type()),
+        ("vote_type", _name_type()),
+        ("is_valid", pa.bool_()),
+        ("candidate_id", pa.int64()),
+        ("candidate_name", _name_type()),
+        ("party_id", pa.int64()),      # บัตรเขต = พรรคของผู้สมัคร (เหมือน GET /ballots)
+        ("party_name", _name_type()),
+        ("voted_at", pa.timestamp("us", tz="UTC")),
+    ])
+
+
+class _Lookups:
+    """ตาราง id -> ค่า จาก refcache ในรูป arrow array (ใช้กับ pc.index_in + take)"""
+
+    def __init__(self, snapshot: refcache.RefSnapshot):
+        consts = snapshot.constituencies
+        self.const_ids = pa.array(list(consts), pa.int64())
+        self.const_numbers = pa.array([c.const_number for c in consts.values()], pa.int64())
+        region_ids = list(snapshot.regions)
+        self.region_names = pa.array(list(snapshot.regions.values()), pa.string())
+        self.const_region_pos = pc.index_in(
+            pa.array([c.region_id for c in consts.values()], pa.int64()),
+            value_set=pa.array(region_ids, pa.int64()),
+        )
+
+        cands = snapshot.candidates
+        self.candidate_ids = pa.array(list(cands), pa.int64())
+        self.candidate_names = pa.array([c.full_name for c in cands.values()], pa.string())
+        self.candidate_party_ids = pa.array([c.party_id for c in cands.values()], pa.int64())
+
+        self.party_ids = pa.array(list(snapshot.parties), pa.int64())
+        self.party_names = pa.array(list(snapshot.parties.values()), pa.string())
+
+
+def _dictionary(indices, names):
+    # indices = ตำแหน่งใน names (null = ไม่มี) -> dictionary<int32, string>
+    return pa.DictionaryArray.from_arrays(indices.cast(pa.int32()), names)
+
+
+def _timestamps(values: tuple):
+    if values and isinstance(values[0], str):
+        naive = pc.cast(pa.array(values, pa.string()), pa.timestamp("us"))
+        return naive.cast(pa.timestamp("us", tz="UTC"))
+    return pa.array(values, pa.timestamp("us", tz="UTC"))
+
+
+def _to_batch(rows: list, lookups: _Lookups):
+    ballot_id, const_id, vote_type, is_valid, candidate_id, party_id, voted_at = zip(*rows)
+
+    const_id = pa.array(const_id, pa.int64())
+    candidate_id = pa.array(candidate_id, pa.int64())
+    const_pos = pc.index_in(const_id, value_set=lookups.const_ids)
+    candidate_pos = pc.index_in(candidate_id, value_set=lookups.candidate_ids)
+
+    # บัตรเขตไม่มี party_id ในตัวบัตร -> ใช้พรรคของผู้สมัคร
+    party_id = pc.coalesce(
+        pa.array(party_id, pa.int64()),
+        pc.take(lookups.candidate_party_ids, candidate_pos),
+    )
+    party_pos = pc.index_in(party_id, value_set=lookups.party_ids)
+
+    return pa.RecordBatch.from_arrays(
+        [
+            pa.array(ballot_id, pa.int64()),
+            const_id,
+            pc.take(lookups.const_numbers, const_pos),
+            _dictionary(pc.take(lookups.const_region_pos, const_pos), lookups.region_names),
+            pa.array(vote_type, pa.string()).dictionary_encode(),
+            pa.array(is_valid, pa.bool_()),
+            candidate_id,
+            _dictionary(candidate_pos, lookups.candidate_names),
+            party_id,
+            _dictionary(party_pos, lookups.party_names),
+            _timestamps(voted_at),
+        ],
+        schema=schema(),
+    )
+
+
+def record_batches(session: Session, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator:
+    """อ่าน Ballots ตามลำดับ ballot_id ทีละ batch_size แถว"""
+    lookups = _Lookups(refcache.get(session))
+    connection = session.connection()
+
+    voted_at = Ballot.voted_at
+    if connection.dialect.name == "sqlite":
+        # sqlite เก็บเวลาเป็น text (UTC) -> ดึง text ตรง ๆ แล้วให้ arrow แปลงทั้งคอลัมน์
+        # แทนการ parse datetime ทีละแถวใน python
+        voted_at = type_coerce(Ballot.voted_at, String)
+
+    statement = (
+        select(
+            Ballot.ballot_id,
+            Ballot.const_id,
+            Ballot.vote_type,
+            Ballot.is_valid,
+            Ballot.candidate_id,
+            Ballot.party_id,
+            voted_at,
+        )
+        .order_by(Ballot.ballot_id)
+    )
+    # Core (ไม่ผ่าน ORM) -> ได้ tuple จาก cursor ตรง ๆ
+    result = connection.execution_options(yield_per=batch_size).execute(statement)
+    for rows in result.partitions():
+        yield _to_batch(rows, lookups)
+
+
+class _ChunkSink:
+    """file-like ที่เก็บ bytes ที่ writer เขียน -> ดึงออกไปส่งทีละก้อน (ไม่ต้องมีไฟล์จริง)"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def writable(self) -> bool:
+        return True
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _open_writer(sink, fmt: str):
+    if fmt == "arrow":
+        return pa.ipc.new_stream(sink, schema())
+    if fmt == "parquet":
+        # 1 record batch = 1 row group
+        return pq.ParquetWriter(sink, schema(), compression=PARQUET_COMPRESSION)
+    raise ValueError(f"Unknown format: {fmt!r} (use one of {', '.join(FORMATS)})")
+
+
+def _write_batch(writer, fmt: str, batch) -> None:
+    if fmt == "arrow":
+        writer.write_batch(batch)
+    else:
+        writer.write_batch(batch, row_group_size=batch.num_rows)
+
+
+def _all_batches(batch_size: int) -> Iterator:
+    # โหมด shard: ช่วง ballot_id ของ shard เรียงต่อกัน -> อ่านทีละ shard ได้ลำดับ ballot_id เดิม
+    import sharding
+
+    for engine in sharding.data_engines():
+        with Session(engine) as session:
+            yield from record_batches(session, batch_size)
+
+
+def stream_ballots(fmt: str, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[bytes]:
+    """สำหรับ StreamingResponse: เปิด session เอง แล้ว yield bytes ทีละ record batch"""
+    sink = _ChunkSink()
+    writer = _open_writer(sink, fmt)
+    for batch in _all_batches(batch_size):
+        _write_batch(writer, fmt, batch)
+        yield sink.take()
+    writer.close()
+    yield sink.take()
+
+
+def write_ballots(path: str, fmt: str, batch_size: int = DEFAULT_BATCH_SIZE, progress=None) -> int:
+    """เขียนลงไฟล์ คืนจำนวนแถว"""
+    rows = 0
+    with pa.OSFile(path, "wb") as sink:
+        writer = _open_writer(sink, fmt)
+        for batch in _all_batches(batch_size):
+            _write_batch(writer, fmt, batch)
+            rows += batch.num_rows
+            if progress:
+                progress(rows)
+        writer.close()
+    return rows
+
+
+# =========================
+# CLI
+# =========================
+
+def _guess_format(path: str) -> Optional[str]:
+    if path.endswith(".parquet"):
+        return "parquet"
+    if path.endswith((".arrow", ".arrows", ".ipc")):
+        return "arrow"
+    return None
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Export Ballots to Arrow IPC stream / Parquet")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=FORMATS, help="default: from file extension")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    if not available():
+        print("pyarrow is not installed (pip install pyarrow)", file=sys.stderr)
+        return 1
+
+    fmt = args.format or _guess_format(args.path)
+    if fmt is None:
+        parser.error("cannot infer format from file extension; pass --format")
+
+    start = time.perf_counter()
+
+    def progress(rows: int) -> None:
+        elapsed = time.perf_counter() - start
+        rate = rows / elapsed if elapsed else 0.0
+        print(f"exported {rows:,} ballots ({rate:,.0f} rows/s)", file=sys.stderr)
+
+    rows = write_ballots(args.path, fmt, batch_size=args.batch_size, progress=progress)
+    print(f"wrote {rows:,} ballots to {args.path} in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
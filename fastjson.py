@@ -0,0 +1,46 @@
+import json
+from datetime import date, datetime
+from typing import Any
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy.engine import Row
+
+try:
+    import orjson
+except ImportError:  # ไม่มี orjson -> ใช้ json ของ stdlib (ผลลัพธ์หน้าตาเดียวกัน แค่ช้ากว่า)
+    orjson = None
+
+
+# =========================
+# Fast JSON (orjson)
+# =========================
+# ใช้กับ response ที่เป็น list ใหญ่: คืน FastJSONResponse ตรง ๆ จาก endpoint
+# -> FastAPI ข้าม jsonable_encoder / การ validate response_model (ยังใช้ response_model ทำ docs ได้)
+# รองรับ Row ของ SQLAlchemy, SQLModel object และ datetime โดยไม่ต้องแปลงเป็น dict เองก่อน
+
+
+def _default(value: Any):
+    # orjson/json เรียกเฉพาะ type ที่ serialize เองไม่ได้
+    if isinstance(value, Row):
+        return value._asdict()
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """UTF-8 ไม่ escape ภาษาไทย ไม่มีช่องว่าง (รูปแบบเดียวกับ JSONResponse ของ Starlette)"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":"),
+        default=_default,
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,198 @@
+import asyncio
+import json
+import logging
+
+import anyio
+from sqlmodel import Session, select
+
+from models import ConstituencyTally, PartyTally
+import respcache
+import sharding
+
+
+# =========================
+# Live results feed (Server-Sent Events)
+# =========================
+# task เดียวเช็ค ResultsVersions ทุก FLUSH_INTERVAL วินาที (อ่าน 1 แถว)
+# version เปลี่ยน (ballot จาก worker / instance ไหนก็ได้) -> อ่านยอด tally 1 ครั้ง
+# -> เทียบกับยอดรอบก่อนเป็น delta -> encode 1 ครั้ง -> กระจายให้ subscriber ทุกคน
+# (ภาระ db ไม่ขึ้นกับจำนวนคนดู และไม่มีคนดู = ไม่อ่านอะไรเลย)
+
+logger = logging.getLogger("election.live")
+
+FLUSH_INTERVAL = 0.5
+HEARTBEAT_INTERVAL = 15.0
+SUBSCRIBER_QUEUE_SIZE = 100
+
+_subscribers: set = set()
+_seq = 0
+_task = None
+
+# ยอดล่าสุดที่ส่งไปแล้ว (ใช้ทำ delta / snapshot) แก้ภายใต้ _state_lock เท่านั้น
+_state_lock = asyncio.Lock()
+_version = None
+_const_totals: dict = {}  # (const_id, candidate_id) -> votes
+_party_totals: dict = {}  # (const_id, party_id) -> votes
+_snapshot_cache = (None, None)  # (version, bytes)
+
+
+def _sse(event: str, data: dict, id: int | None = None) -> bytes:
+    lines = [f"event: {event}"]
+    if id is not None:
+        lines.append(f"id: {id}")
+    lines.append("data: " + json.dumps(data, ensure_ascii=False, separators=(",", ":")))
+    return ("\n".join(lines) + "\n\n").encode("utf-8")
+
+
+# =========================
+# Aggregation (รันใน thread)
+# =========================
+
+def _read_totals() -> tuple:
+    """คืน (version, const_totals, party_totals) รวมทุก shard (tally ของเขตหนึ่งกระจายอยู่หลาย shard)"""
+    # อ่าน version ก่อนยอด: ballot ที่ commit ระหว่างอ่านจะทำให้ version รอบหน้าต่างไป -> ไม่ตกหล่น
+    version = respcache.current_version()
+    const_totals = {}
+    party_totals = {}
+    for engine in sharding.data_engines():
+        with Session(engine) as session:
+            for r in session.exec(
+                select(ConstituencyTally.const_id, ConstituencyTally.candidate_id, ConstituencyTally.votes)
+            ):
+                key = (r.const_id, r.candidate_id)
+                const_totals[key] = const_totals.get(key, 0) + r.votes
+            for r in session.exec(select(PartyTally.const_id, PartyTally.party_id, PartyTally.votes)):
+                key = (r.const_id, r.party_id)
+                party_totals[key] = party_totals.get(key, 0) + r.votes
+    return version, const_totals, party_totals
+
+
+def _changes(old: dict, new: dict) -> list:
+    """[(key, delta, votes)] ของ key ที่ยอดเปลี่ยน เรียงตาม key"""
+    return [(key, votes - old.get(key, 0), votes) for key, votes in sorted(new.items()) if votes != old.get(key, 0)]
+
+
+async def _refresh() -> None:
+    """
+    version ใน db เปลี่ยน -> อ่านยอดใหม่ ส่ง delta ให้ subscriber (ต้องถือ _state_lock)
+    รอบแรก (ยังไม่มียอดเดิม) แค่จำยอดไว้ ไม่ส่ง delta
+    """
+    global _version, _const_totals, _party_totals, _seq
+
+    version = await anyio.to_thread.run_sync(respcache.current_version)
+    if version == _version:
+        return
+    version, const_totals, party_totals = await anyio.to_thread.run_sync(_read_totals)
+
+    first = _version is None
+    const_changes = _changes(_const_totals, const_totals)
+    party_changes = _changes(_party_totals, party_totals)
+    _version, _const_totals, _party_totals = version, const_totals, party_totals
+    if first or not (const_changes or party_changes):
+        return
+
+    # ส่งทั้ง delta และยอดรวมล่าสุด (votes) -> client ใช้ยอดรวมได้โดยไม่กลัวนับซ้ำ/ตกหล่น
+    _seq += 1
+    message = _sse("delta", {
+        "seq": _seq,
+        "constituency": [
+            {"const_id": c, "candidate_id": k, "delta": n, "votes": votes}
+            for (c, k), n, votes in const_changes
+        ],
+        "party": [
+            {"const_id": c, "party_id": p, "delta": n, "votes": votes}
+            for (c, p), n, votes in party_changes
+        ],
+    }, id=_seq)
+
+    for queue in list(_subscribers):
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # อ่านไม่ทัน -> ตัดการเชื่อมต่อ ให้ client reconnect แล้วรับ snapshot ใหม่
+            _subscribers.discard(queue)
+            _drop(queue)
+
+
+def _snapshot_message() -> bytes:
+    # คนเข้ามาพร้อมกันเยอะ ๆ ใช้ snapshot เดียวกันถ้ายังไม่มี ballot ใหม่ (ต้องถือ _state_lock)
+    global _snapshot_cache
+    cached_version, body = _snapshot_cache
+    if cached_version != _version:
+        data = {
+            "constituency": [
+                {"const_id": c, "candidate_id": k, "votes": votes}
+                for (c, k), votes in sorted(_const_totals.items())
+            ],
+            "party": [
+                {"const_id": c, "party_id": p, "votes": votes}
+                for (c, p), votes in sorted(_party_totals.items())
+            ],
+            "seq": _seq,
+        }
+        body = _sse("snapshot", data, id=_seq)
+        _snapshot_cache = (_version, body)
+    return body
+
+
+async def _flush() -> None:
+    if not _subscribers:
+        return
+    async with _state_lock:
+        await _refresh()
+
+
+def _drop(queue: asyncio.Queue) -> None:
+    while not queue.empty():
+        queue.get_nowait()
+    queue.put_nowait(None)
+
+
+async def _run() -> None:
+    while True:
+        await asyncio.sleep(FLUSH_INTERVAL)
+        try:
+            await _flush()
+        except Exception:  # feed ต้องไม่ตายเพราะรอบเดียวพัง
+            logger.exception("live results flush failed")
+
+
+def start() -> None:
+    """เรียกใน lifespan ตอน start app"""
+    global _task
+    if _task is None:
+        _task = asyncio.get_running_loop().create_task(_run())
+
+
+async def stop() -> None:
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
+
+
+async def subscribe():
+    """async generator สำหรับ StreamingResponse: snapshot 1 ครั้ง แล้วตามด้วย delta"""
+    queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+    # snapshot + ลงทะเบียนภายใต้ lock เดียวกับ _flush -> delta ถัดไปต่อจาก snapshot พอดี ไม่พลาด/ไม่ซ้ำ
+    async with _state_lock:
+        await _refresh()
+        snapshot = _snapshot_message()
+        _subscribers.add(queue)
+    try:
+        yield snapshot
+        while True:
+            try:
+                message = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                yield b": ping\n\n"
+                continue
+            if message is None:
+                break
+            yield message
+    finally:
+        _subscribers.discard(queue)
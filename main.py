@@ -1,12 +1,46 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from sqlmodel import Session, select, func
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import aliased
-from typing import List
-
-from database import create_db_and_tables, get_session
-from models import Region, Constituency, Party, Candidate, Voter, Ballot
-
-from contextlib import asynccontextmanager
+from sqlalchemy.orm.attributes import set_committed_value
+from typing import List, Literal
+from collections import Counter
+import heapq
+import io
+import itertools
+import os
+import secrets
+import tempfile
+import time
+
+from database import (
+    engine, async_engine, create_db_and_tables,
+    get_session, get_async_session, AsyncSession,
+)
+from models import (
+    Region, Constituency, Party, Candidate, Voter, Ballot,
+    ConstituencyTally, PartyTally,
+)
+import tally
+import refcache
+import metrics
+import slowlog
+import respcache
+import live
+from seats import METHODS as SEAT_METHODS, allocate as allocate_seats, available as seats_available
+import voter_import
+import export
+import citizen_filter
+import fastjson
+import sharding
+from sharding import get_results_session
+from fastjson import FastJSONResponse
+from content_encoding import CompressionMiddleware
+
+from contextlib import ExitStack, asynccontextmanager
 
 
 # =========================
@@ -16,9 +50,85 @@ from contextlib import asynccontextmanager
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     create_db_and_tables()
+    with Session(engine) as session:
+        tally.ensure_tallies(session)
+    if sharding.enabled():
+        sharding.create_shard_tables()
+    live.start()
     yield
+    await live.stop()
+    if async_engine is not None:
+        await async_engine.dispose()
 
 app = FastAPI(title="Election Backend Midterm", lifespan=lifespan)
+app.add_middleware(CompressionMiddleware)
+
+for _engine in [engine, *sharding.engines]:
+    metrics.instrument_engine(_engine)
+    slowlog.instrument_engine(_engine)
+if async_engine is not None:
+    metrics.instrument_engine(async_engine.sync_engine)
+    slowlog.instrument_engine(async_engine.sync_engine)
+
+# /admin/* ต้องส่ง header X-Admin-Token ให้ตรงกับ ADMIN_TOKEN
+# ไม่ได้ตั้ง ADMIN_TOKEN = ปิด /admin/* ทั้งหมด (404) -> slow query log มี parameter จริง เช่น citizen_id / ชื่อ
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+MAX_PAGE_SIZE = 10_000  # limit สูงสุดของ endpoint แบบแบ่งหน้า
+
+
+# =========================================================
+# Metrics (/metrics รูปแบบ Prometheus)
+# =========================================================
+@app.middleware("http")
+async def metrics_middleware(request: Request, call_next):
+    stats, token = metrics.start_request()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # ใช้ path template ของ route (เช่น /voters/{voter_id}/status) ไม่ใช่ url จริง
+        route = request.scope.get("route")
+        metrics.finish_request(
+            stats, token,
+            method=request.method,
+            route=route.path if route else "unmatched",
+            status=status,
+            elapsed=time.perf_counter() - start,
+        )
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+# =========================================================
+# Admin
+# =========================================================
+def require_admin(x_admin_token: str | None = Header(default=None)) -> None:
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if x_admin_token is None or not secrets.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+@app.get("/admin/slow-queries", dependencies=[Depends(require_admin)])
+def get_slow_queries(limit: int = Query(default=50, ge=1, le=slowlog.SLOW_QUERY_LOG_SIZE)):
+    return {
+        "enabled": slowlog.enabled(),
+        "threshold_ms": float(slowlog.SLOW_QUERY_MS) if slowlog.enabled() else None,
+        "queries": slowlog.entries()[:limit],
+    }
+
+
+@app.delete("/admin/slow-queries", dependencies=[Depends(require_admin)])
+def clear_slow_queries():
+    slowlog.clear()
+    return {"cleared": True}
 
 
 # =========================================================
@@ -27,14 +137,15 @@ app = FastAPI(title="Election Backend Midterm", lifespan=lifespan)
 @app.post("/regions")
 def create_region(region: Region, session: Session = Depends(get_session)):
     session.add(region)
+    tally.bump_version(session)  # ชื่อ/จำนวนผู้มีสิทธิในผลคะแนนเปลี่ยน
     session.commit()
-    session.refresh(region)
+    refcache.invalidate()
     return region
 
 
 @app.get("/regions", response_model=List[Region])
 def get_regions(session: Session = Depends(get_session)):
-    return session.exec(select(Region)).all()
+    return FastJSONResponse(session.exec(select(*Region.__table__.columns)).all())
 
 
 # =========================================================
@@ -43,19 +154,20 @@ def get_regions(session: Session = Depends(get_session)):
 @app.post("/constituencies")
 def create_constituency(constituency: Constituency, session: Session = Depends(get_session)):
     # optional: เช็ค region มีจริง
-    region = session.get(Region, constituency.region_id)
+    region = refcache.lookup(session, "regions", constituency.region_id)
     if not region:
         raise HTTPException(status_code=404, detail="Region not found")
 
     session.add(constituency)
+    tally.bump_version(session)  # ชื่อ/จำนวนผู้มีสิทธิในผลคะแนนเปลี่ยน
     session.commit()
-    session.refresh(constituency)
+    refcache.invalidate()
     return constituency
 
 
 @app.get("/constituencies", response_model=List[Constituency])
 def get_constituencies(session: Session = Depends(get_session)):
-    return session.exec(select(Constituency)).all()
+    return FastJSONResponse(session.exec(select(*Constituency.__table__.columns)).all())
 
 
 # =========================================================
@@ -64,14 +176,15 @@ def get_constituencies(session: Session = Depends(get_session)):
 @app.post("/parties")
 def create_party(party: Party, session: Session = Depends(get_session)):
     session.add(party)
+    tally.bump_version(session)  # ชื่อ/จำนวนผู้มีสิทธิในผลคะแนนเปลี่ยน
     session.commit()
-    session.refresh(party)
+    refcache.invalidate()
     return party
 
 
 @app.get("/parties", response_model=List[Party])
 def get_parties(session: Session = Depends(get_session)):
-    return session.exec(select(Party)).all()
+    return FastJSONResponse(session.exec(select(*Party.__table__.columns)).all())
 
 
 # =========================================================
@@ -80,44 +193,204 @@ def get_parties(session: Session = Depends(get_session)):
 @app.post("/candidates")
 def create_candidate(candidate: Candidate, session: Session = Depends(get_session)):
     # optional: เช็ค const + party มีจริง
-    const = session.get(Constituency, candidate.const_id)
+    const = refcache.lookup(session, "constituencies", candidate.const_id)
     if not const:
         raise HTTPException(status_code=404, detail="Constituency not found")
 
-    party = session.get(Party, candidate.party_id)
+    party = refcache.lookup(session, "parties", candidate.party_id)
     if not party:
         raise HTTPException(status_code=404, detail="Party not found")
 
     session.add(candidate)
+    tally.bump_version(session)  # ชื่อ/จำนวนผู้มีสิทธิในผลคะแนนเปลี่ยน
     session.commit()
-    session.refresh(candidate)
+    refcache.invalidate()
     return candidate
 
 
 @app.get("/candidates", response_model=List[Candidate])
 def get_candidates(session: Session = Depends(get_session)):
-    return session.exec(select(Candidate)).all()
+    return FastJSONResponse(session.exec(select(*Candidate.__table__.columns)).all())
 
 
 # =========================================================
 # Voters
 # =========================================================
+def _exec_all(session: Session, statement, sort_key=None, limit: int | None = None) -> list:
+    """
+    โหมด shard: รัน statement กับทุก shard แล้วรวมผล (เรียงด้วย sort_key + ตัดตาม limit อีกรอบ)
+    โหมดไฟล์เดียว = session.exec(statement).all()
+    """
+    if not sharding.enabled():
+        return session.exec(statement).all()
+
+    rows = [r for part in sharding.scatter(lambda s: s.exec(statement).all()) for r in part]
+    if sort_key is not None:
+        rows.sort(key=sort_key)
+    return rows if limit is None else rows[:limit]
+
+
 @app.post("/voters")
 def create_voter(voter: Voter, session: Session = Depends(get_session)):
-    const = session.get(Constituency, voter.const_id)
+    const = refcache.lookup(session, "constituencies", voter.const_id)
     if not const:
         raise HTTPException(status_code=404, detail="Constituency not found")
 
+    if not sharding.enabled():
+        return _insert_voter(voter, session)
+
+    # โหมด shard: citizen_id เดียวกันอยู่ shard เดียวกันเสมอ -> unique index กันซ้ำได้
+    with sharding.session_for_citizen(voter.citizen_id) as shard_session:
+        return _insert_voter(voter, shard_session)
+
+
+def _insert_voter(voter: Voter, session: Session) -> Voter:
     session.add(voter)
-    session.commit()
-    session.refresh(voter)
+    try:
+        tally.bump_voters_version(session, 1)  # flush voter ก่อน -> citizen_id ซ้ำชน unique index ตรงนี้
+        session.commit()
+    except IntegrityError:
+        # unique index ของ citizen_id (request ที่มาพร้อมกันก็ผ่านได้คนเดียว)
+        session.rollback()
+        raise HTTPException(status_code=400, detail="Citizen already registered")
+    citizen_filter.add(voter.citizen_id)
     return voter
 
 
+# ----- Bulk import: body เป็น CSV (citizen_id,full_name,const_id) -----
+
+@app.post("/voters/import")
+async def import_voters_csv(
+    request: Request,
+    chunk_size: int = Query(default=voter_import.DEFAULT_CHUNK_SIZE, ge=100, le=100_000),
+):
+    # stream body ลงไฟล์ชั่วคราว (ไม่เก็บทั้งก้อนใน memory) แล้ว import ใน thread
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as raw:
+        async for chunk in request.stream():
+            raw.write(chunk)
+        raw.seek(0)
+
+        text = io.TextIOWrapper(raw, encoding="utf-8-sig", newline="")
+        try:
+            # citizen_id ที่ commit แล้วเข้า filter ทีละ chunk -> ค้นเจอได้ทันทีระหว่าง import ยาว ๆ
+            return await run_in_threadpool(
+                voter_import.import_voters_file, text, chunk_size, None, citizen_filter.add_many,
+            )
+        finally:
+            text.detach()
+
+
+# - ไม่ส่ง limit/after = ได้ทั้งหมด เรียงตามเขตแบบเดิม
+# - limit/after = keyset pagination บน voter_id (หน้าถัดไปส่ง after=X-Next-After)
+#   ใช้คู่กับ const_id จะวิ่งบน index (const_id, voter_id)
 @app.get("/voters")
-def get_voters(session: Session = Depends(get_session)):
-    statement = (
+def get_voters(
+    const_id: int | None = None,
+    has_voted_const: int | None = None,
+    has_voted_list: int | None = None,
+    limit: int | None = Query(default=None, ge=1, le=MAX_PAGE_SIZE),
+    after: int | None = None,
+    session: Session = Depends(get_session),
+):
+    statement = _voters_statement()
+
+    if const_id is not None:
+        statement = statement.where(Voter.const_id == const_id)
+    if has_voted_const is not None:
+        statement = statement.where(Voter.has_voted_const == has_voted_const)
+    if has_voted_list is not None:
+        statement = statement.where(Voter.has_voted_list == has_voted_list)
+
+    if limit is None and after is None:
+        statement = statement.order_by(Constituency.const_number, Voter.voter_id)
+        sort_key = lambda r: (r.const_number, r.voter_id)
+    else:
+        # after ไม่มี limit = ทุกคนที่ voter_id > after (เหมือน GET /ballots)
+        if after is not None:
+            statement = statement.where(Voter.voter_id > after)
+        statement = statement.order_by(Voter.voter_id)
+        if limit is not None:
+            statement = statement.limit(limit)
+        sort_key = lambda r: r.voter_id
+
+    rows = _exec_all(session, statement, sort_key, limit)
+
+    # หน้าเต็ม = อาจมีหน้าถัดไป
+    headers = {}
+    if limit is not None and len(rows) == limit:
+        headers["X-Next-After"] = str(rows[-1].voter_id)
+
+    return FastJSONResponse([_voter_item(r) for r in rows], headers=headers)
+
+
+# ----- ตรวจสิทธิ์ที่หน่วยเลือกตั้ง: ค้นด้วย citizen_id (unique index) -----
+# citizen_filter ตอบ "ไม่มีแน่นอน" ได้โดยไม่ค้น Voters -> 404 ทันที
+# (เฉพาะตอน filter ตามทันทุกการเขียน ไม่งั้นค้นด้วย index ตามปกติ)
+
+MAX_CITIZEN_LOOKUP = 1000
+CITIZEN_LOOKUP_CHUNK = 500  # จำนวน parameter ใน IN (...) ต่อ query
+
+
+@app.get("/voters/by-citizen/{citizen_id}")
+def get_voter_by_citizen(citizen_id: str, session: Session = Depends(get_session)):
+    if citizen_filter.absent([citizen_id]):
+        raise HTTPException(status_code=404, detail="Voter not found")
+
+    rows = _voters_by_citizen(session, [citizen_id])
+    if not rows:
+        raise HTTPException(status_code=404, detail="Voter not found")
+    row = rows[citizen_id]
+    return {"voter_id": row.voter_id, **_voter_item(row)}
+
+
+@app.post("/voters/by-citizen")
+def get_voters_by_citizen(citizen_ids: List[str], session: Session = Depends(get_session)):
+    if len(citizen_ids) > MAX_CITIZEN_LOOKUP:
+        raise HTTPException(status_code=413, detail=f"Lookup too large (max {MAX_CITIZEN_LOOKUP})")
+
+    absent = citizen_filter.absent(citizen_ids)
+    wanted = [c for c in dict.fromkeys(citizen_ids) if c not in absent]
+    rows = _voters_by_citizen(session, wanted)
+
+    # เรียงตามลำดับที่ส่งมา
+    found, not_found = [], []
+    for c in dict.fromkeys(citizen_ids):
+        r = rows.get(c)
+        if r is None:
+            not_found.append(c)
+        else:
+            found.append({"voter_id": r.voter_id, **_voter_item(r)})
+    return {"found": found, "not_found": not_found}
+
+
+def _voters_by_citizen(session: Session, citizen_ids: list) -> dict:
+    """
+    {citizen_id: row} ของ citizen_id ที่มีในทะเบียน
+    โหมด shard: citizen_id บอก shard ได้เลย (shard_of_citizen) -> query เฉพาะ shard ที่เกี่ยว ไม่ scatter
+    """
+    def lookup(s: Session, ids: list) -> list:
+        rows = []
+        for i in range(0, len(ids), CITIZEN_LOOKUP_CHUNK):
+            chunk = ids[i:i + CITIZEN_LOOKUP_CHUNK]
+            rows.extend(s.exec(_voters_statement().where(Voter.citizen_id.in_(chunk))).all())
+        return rows
+
+    if not citizen_ids:
+        return {}
+    if not sharding.enabled():
+        return {r.citizen_id: r for r in lookup(session, citizen_ids)}
+
+    groups: dict = {}
+    for citizen_id in citizen_ids:
+        groups.setdefault(sharding.shard_of_citizen(citizen_id), []).append(citizen_id)
+    tasks = {shard: (lambda s, ids=ids: lookup(s, ids)) for shard, ids in groups.items()}
+    return {r.citizen_id: r for part in sharding.run_on(tasks).values() for r in part}
+
+
+def _voters_statement():
+    return (
         select(
+            Voter.voter_id,
             Voter.citizen_id,
             Voter.full_name,
             Constituency.const_number,
@@ -125,23 +398,20 @@ def get_voters(session: Session = Depends(get_session)):
             Voter.has_voted_list,
         )
         .join(Constituency, Constituency.const_id == Voter.const_id)
-        .order_by(Constituency.const_number)
     )
 
-    rows = session.exec(statement).all()
 
-    return [
-        {
-            "citizen_id": r.citizen_id,
-            "full_name": r.full_name,
-            "เขตเลือกตั้ง": f"เขต {r.const_number}",
+def _voter_item(r) -> dict:
+    return {
+        "citizen_id": r.citizen_id,
+        "full_name": r.full_name,
+        "เขตเลือกตั้ง": f"เขต {r.const_number}",
+
+        # ✔ ใช้สิทธิแล้วทั้งบัตรดีและเสีย
+        "บัตรเขต": "ใช้สิทธิแล้ว" if r.has_voted_const else "ยังไม่ใช้สิทธิ",
+        "บัตรพรรค": "ใช้สิทธิแล้ว" if r.has_voted_list else "ยังไม่ใช้สิทธิ",
+    }
 
-            # ✔ ใช้สิทธิแล้วทั้งบัตรดีและเสีย
-            "บัตรเขต": "ใช้สิทธิแล้ว" if r.has_voted_const else "ยังไม่ใช้สิทธิ",
-            "บัตรพรรค": "ใช้สิทธิแล้ว" if r.has_voted_list else "ยังไม่ใช้สิทธิ",
-        }
-        for r in rows
-    ]
 
 @app.put("/voters/{voter_id}/status")
 def update_voter_status(
@@ -150,29 +420,44 @@ def update_voter_status(
     has_voted_list: int | None = None,
     session: Session = Depends(get_session),
 ):
-    voter = session.get(Voter, voter_id)
-    if not voter:
-        raise HTTPException(status_code=404, detail="Voter not found")
-
-    if has_voted_const is not None:
-        voter.has_voted_const = has_voted_const
-    if has_voted_list is not None:
-        voter.has_voted_list = has_voted_list
-
-    session.add(voter)
-    session.commit()
-    session.refresh(voter)
-    return voter
+    with sharding.session_for_id(voter_id, session) as voter_session:
+        voter = voter_session.get(Voter, voter_id) if voter_session is not None else None
+        if not voter:
+            raise HTTPException(status_code=404, detail="Voter not found")
+
+        for vote_type, value in (("Constituency", has_voted_const), ("PartyList", has_voted_list)):
+            if value is None:
+                continue
+            # UPDATE แบบมีเงื่อนไข (เหมือน _mark_voted): delta มาจากแถวที่เปลี่ยนจริง
+            # ไม่ใช่ค่าที่อ่านไว้ก่อน -> ballot ที่ commit แทรกเข้ามาไม่ถูกนับ turnout ซ้ำ
+            flag = tally.VOTED_FLAGS[vote_type]
+            column = getattr(Voter, flag)
+            changed = column == 0 if value else column != 0
+            result = voter_session.execute(
+                update(Voter)
+                .where(Voter.voter_id == voter_id, changed)
+                .values({flag: value})
+                .execution_options(synchronize_session=False)
+            )
+            delta = result.rowcount if value else -result.rowcount
+            tally.record_turnout_change(voter_session, voter.const_id, vote_type, delta)
+
+        voter_session.commit()
+        voter_session.refresh(voter)
+        return voter
 
 
 # =========================================================
 # Ballots (สำคัญ)
 # =========================================================
-@app.post("/ballots")
-def create_ballot(ballot: Ballot, session: Session = Depends(get_session)):
-    voter = session.get(Voter, ballot.voter_id)
-    if not voter:
-        raise HTTPException(status_code=404, detail="Voter not found")
+def _judge_ballot(ballot: Ballot, voter: Voter, session: Session, mark_voted=None) -> None:
+    """
+    ตัดสินบัตรดี/เสีย + อัปเดตสถานะการใช้สิทธิของ voter (ยังไม่ commit)
+    ใช้ร่วมกันระหว่าง POST /ballots และ POST /ballots/batch
+    mark_voted(session, voter, flag) -> bool (default = _mark_voted, batch ส่งตัวที่ใช้ผลของ _claim_votes)
+    โหวตซ้ำ -> raise HTTPException(400)
+    """
+    mark_voted = mark_voted or _mark_voted
 
     # voter ต้องอยู่เขตเดียวกับ ballot (ถ้าผิด = บัตรเสีย แต่ยังเก็บ)
     if voter.const_id != ballot.const_id:
@@ -182,23 +467,20 @@ def create_ballot(ballot: Ballot, session: Session = Depends(get_session)):
     if ballot.vote_type not in ["Constituency", "PartyList"]:
         ballot.is_valid = False
         # ไม่รู้จะ update flag อะไร -> ไม่อัปเดตสถานะโหวต
-        session.add(ballot)
-        session.commit()
-        session.refresh(ballot)
-        return ballot
+        return
 
     # -------- ตัดสินบัตรดี/เสียจากรูปแบบข้อมูล --------
     if ballot.vote_type == "Constituency":
-        # กันโหวตซ้ำ (ยังกันเหมือนเดิม)
-        if voter.has_voted_const:
+        # กันโหวตซ้ำ + ถือว่าใช้สิทธิแล้ว (แม้บัตรเสียก็ใช้สิทธิแล้วในชีวิตจริง)
+        if not mark_voted(session, voter, "has_voted_const"):
             raise HTTPException(status_code=400, detail="Already voted constituency")
 
         # เงื่อนไขบัตรดี: ต้องมี candidate_id และต้องไม่มี party_id
         good = (ballot.candidate_id is not None) and (ballot.party_id is None)
 
-        # ตรวจ candidate ถ้าจะเป็นบัตรดี
+        # ตรวจ candidate ถ้าจะเป็นบัตรดี (จาก refcache ไม่ต้องยิง SQL)
         if good:
-            candidate = session.get(Candidate, ballot.candidate_id)
+            candidate = refcache.lookup(session, "candidates", ballot.candidate_id)
             if not candidate or candidate.const_id != ballot.const_id:
                 good = False
 
@@ -210,18 +492,15 @@ def create_ballot(ballot: Ballot, session: Session = Depends(get_session)):
             # จะให้ candidate_id ค้างไว้หรือไม่ก็ได้; แนะนำล้างเพื่อ privacy/clean
             ballot.candidate_id = None
 
-        # ถือว่าใช้สิทธิแล้ว (แม้บัตรเสียก็ใช้สิทธิแล้วในชีวิตจริง)
-        voter.has_voted_const = 1
-
     elif ballot.vote_type == "PartyList":
-        if voter.has_voted_list:
+        if not mark_voted(session, voter, "has_voted_list"):
             raise HTTPException(status_code=400, detail="Already voted party list")
 
         # เงื่อนไขบัตรดี: ต้องมี party_id และต้องไม่มี candidate_id
         good = (ballot.party_id is not None) and (ballot.candidate_id is None)
 
         if good:
-            party = session.get(Party, ballot.party_id)
+            party = refcache.lookup(session, "parties", ballot.party_id)
             if not party:
                 good = False
 
@@ -231,23 +510,191 @@ def create_ballot(ballot: Ballot, session: Session = Depends(get_session)):
             ballot.candidate_id = None
             ballot.party_id = None
 
-        voter.has_voted_list = 1
 
-    session.add(ballot)
-    session.add(voter)
+def _mark_voted(session: Session, voter: Voter, flag: str) -> bool:
+    """
+    UPDATE Voters SET <flag>=1 WHERE voter_id=? AND <flag>=0
+    ตัดสินด้วยจำนวนแถวที่ถูกแก้ -> request ที่มาพร้อมกันผ่านได้แค่ใบเดียว (ไม่ต้อง lock ทั้ง endpoint)
+    synchronize_session=False: ไม่ให้ ORM ไล่ตรวจทุก Voter ใน session -> set ค่าให้ object voter เอง
+    """
+    column = getattr(Voter, flag)
+    result = session.execute(
+        update(Voter)
+        .where(Voter.voter_id == voter.voter_id, column == 0)
+        .values({flag: 1})
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        return False
+    set_committed_value(voter, flag, 1)
+    return True
+
+
+def _claim_votes(session: Session, voter_ids_by_flag: dict) -> set:
+    """
+    batch: UPDATE Voters SET <flag>=1 WHERE voter_id IN (...) AND <flag>=0 RETURNING voter_id
+    ครั้งเดียวต่อ chunk แทน UPDATE ทีละใบ
+    คืน {(voter_id, flag)} ที่เปลี่ยนจาก 0 เป็น 1 ได้จริง (ยังไม่ commit)
+    """
+    claimed = set()
+    for flag, voter_ids in voter_ids_by_flag.items():
+        column = getattr(Voter, flag)
+        voter_ids = list(voter_ids)
+        for i in range(0, len(voter_ids), VOTER_LOOKUP_CHUNK):
+            chunk = voter_ids[i:i + VOTER_LOOKUP_CHUNK]
+            result = session.execute(
+                update(Voter)
+                .where(Voter.voter_id.in_(chunk), column == 0)
+                .values({flag: 1})
+                .returning(Voter.voter_id)
+                .execution_options(synchronize_session=False)
+            )
+            claimed.update((voter_id, flag) for voter_id in result.scalars())
+    return claimed
+
+
+@app.post("/ballots")
+def create_ballot(ballot: Ballot, session: Session = Depends(get_session)):
+    # โหมด shard: ballot ลงใน shard เดียวกับ voter (ดูจาก voter_id)
+    with sharding.session_for_id(ballot.voter_id, session) as voter_session:
+        voter = voter_session.get(Voter, ballot.voter_id) if voter_session is not None else None
+        if not voter:
+            metrics.record_ballot_rejected(ballot.vote_type, "Voter not found")
+            raise HTTPException(status_code=404, detail="Voter not found")
+
+        try:
+            _judge_ballot(ballot, voter, voter_session)
+        except HTTPException as e:
+            metrics.record_ballot_rejected(ballot.vote_type, e.detail)
+            raise
+
+        voter_session.add(ballot)
+        tally.record_ballots(voter_session, [ballot], {voter.voter_id: voter})
+        voter_session.commit()
+        metrics.record_ballot_accepted(ballot.vote_type, ballot.is_valid)
+        return ballot
+
+
+# ----- Ballots batch: รับทีละหลายพันใบ commit ครั้งเดียว -----
+
+MAX_BALLOT_BATCH = 10_000
+VOTER_LOOKUP_CHUNK = 500  # กันชน limit ของจำนวน parameter ใน IN (...)
+
+
+@app.post("/ballots/batch")
+def create_ballots_batch(ballots: List[Ballot], session: Session = Depends(get_session)):
+    if len(ballots) > MAX_BALLOT_BATCH:
+        raise HTTPException(status_code=413, detail=f"Batch too large (max {MAX_BALLOT_BATCH})")
+
+    if not sharding.enabled():
+        results = _insert_ballots(list(enumerate(ballots)), session)
+    else:
+        # แยกตาม shard ของ voter แล้วลงทุก shard พร้อมกัน (คนละไฟล์ = คนละ writer lock)
+        results = []
+        groups: dict = {}
+        for index, ballot in enumerate(ballots):
+            shard = sharding.shard_of_id(ballot.voter_id)
+            if shard is None:
+                results.append(_voter_not_found(index, ballot))
+            else:
+                groups.setdefault(shard, []).append((index, ballot))
+
+        tasks = {shard: (lambda s, items=items: _insert_ballots(items, s)) for shard, items in groups.items()}
+        for part in sharding.run_on(tasks).values():
+            results.extend(part)
+        results.sort(key=lambda item: item["index"])
+
+    accepted = sum(1 for item in results if item["status_code"] == 200)
+    return {
+        "accepted": accepted,
+        "rejected": len(ballots) - accepted,
+        "results": results,
+    }
+
+
+def _voter_not_found(index: int, ballot: Ballot) -> dict:
+    metrics.record_ballot_rejected(ballot.vote_type, "Voter not found")
+    return {"index": index, "status_code": 404, "detail": "Voter not found"}
+
+
+def _insert_ballots(items: list, session: Session) -> list:
+    """items = [(index ใน request, ballot)] -> ตัดสิน + insert + commit ครั้งเดียว คืนผลรายใบ"""
+    # ดึง voter ทั้ง batch ทีเดียว แทน session.get ทีละใบ
+    voter_ids = list({b.voter_id for _, b in items})
+    voters = {}
+    for i in range(0, len(voter_ids), VOTER_LOOKUP_CHUNK):
+        chunk = voter_ids[i:i + VOTER_LOOKUP_CHUNK]
+        for v in session.exec(select(Voter).where(Voter.voter_id.in_(chunk))):
+            voters[v.voter_id] = v
+
+    # อัปเดตสถานะการใช้สิทธิของทั้ง batch ก่อน แล้วแจกให้ใบแรกของแต่ละ (voter, ประเภทบัตร)
+    voter_ids_by_flag: dict = {}
+    for _, ballot in items:
+        flag = tally.VOTED_FLAGS.get(ballot.vote_type)
+        if flag is not None and ballot.voter_id in voters:
+            voter_ids_by_flag.setdefault(flag, set()).add(ballot.voter_id)
+    claimed = _claim_votes(session, voter_ids_by_flag)
+
+    def mark_voted(session: Session, voter: Voter, flag: str) -> bool:
+        key = (voter.voter_id, flag)
+        if key not in claimed:
+            return False
+        claimed.discard(key)
+        set_committed_value(voter, flag, 1)
+        return True
+
+    results = []
+    accepted = []
+    for index, ballot in items:
+        voter = voters.get(ballot.voter_id)
+        if not voter:
+            results.append(_voter_not_found(index, ballot))
+            continue
+
+        # ใบที่โหวตซ้ำ (รวมถึงซ้ำกันเองใน batch) -> reject เฉพาะใบนั้น ไม่ล้มทั้ง batch
+        try:
+            _judge_ballot(ballot, voter, session, mark_voted)
+        except HTTPException as e:
+            results.append({"index": index, "status_code": e.status_code, "detail": e.detail})
+            metrics.record_ballot_rejected(ballot.vote_type, e.detail)
+            continue
+
+        session.add(ballot)
+        accepted.append(ballot)
+        results.append({"index": index, "status_code": 200, "ballot": ballot})
+
+    tally.record_ballots(session, accepted, voters)
+
+    # flush เพื่อให้ได้ ballot_id (INSERT ... RETURNING / lastrowid) ก่อนสรุปผลรายใบ
+    session.flush()
+    for item in results:
+        ballot = item.pop("ballot", None)
+        if ballot is not None:
+            item["ballot_id"] = ballot.ballot_id
+            item["is_valid"] = ballot.is_valid
+            item["vote_type"] = ballot.vote_type
+
     session.commit()
-    session.refresh(ballot)
-    return ballot
+
+    for item in results:
+        if item["status_code"] == 200:
+            metrics.record_ballot_accepted(item.pop("vote_type"), item["is_valid"])
+
+    return results
 
 
 # ----- Ballots list: โชว์ชื่อไทยทั้งหมด -----
+# - ไม่ส่ง limit = ได้ทั้งหมดแบบเดิม
+# - limit/after = keyset pagination บน ballot_id (หน้าถัดไปส่ง after=X-Next-After)
+# - format=ndjson = stream ทีละบรรทัดจาก cursor (memory คงที่ แม้ export เป็นล้านใบ)
 
-@app.get("/ballots")
-def get_ballots_final(session: Session = Depends(get_session)):
+STREAM_FETCH_SIZE = 1_000
+
+
+def _ballots_statement(after: int | None = None, limit: int | None = None):
     PartyBallot = aliased(Party)
     PartyCandidate = aliased(Party)
 
-
     statement = (
         select(
             Ballot.ballot_id,
@@ -268,89 +715,125 @@ def get_ballots_final(session: Session = Depends(get_session)):
         .order_by(Ballot.ballot_id)
     )
 
-    rows = session.exec(statement).all()
-    out = []
+    if after is not None:
+        statement = statement.where(Ballot.ballot_id > after)
+    if limit is not None:
+        statement = statement.limit(limit)
+    return statement
 
-    for r in rows:
-        d = r._asdict()
 
-        item = {
-            "ballot_id": d["ballot_id"],
-            "voted_at": d["voted_at"],
-            "ballot_note": "บัตรดี" if d["is_valid"] else "บัตรเสีย",
-            "vote_type": d["vote_type"],
-        }
+def _ballot_item(r) -> dict:
+    item = {
+        "ballot_id": r.ballot_id,
+        "voted_at": r.voted_at,
+        "ballot_note": "บัตรดี" if r.is_valid else "บัตรเสีย",
+        "vote_type": r.vote_type,
+    }
 
-        if d["is_valid"]:
-            if d["vote_type"] == "Constituency":
-                item["candidate_name"] = d["candidate_name"]
-            elif d["vote_type"] == "PartyList":
-                item["party_name"] = d["party_name"]
+    if r.is_valid:
+        if r.vote_type == "Constituency":
+            item["candidate_name"] = r.candidate_name
+        elif r.vote_type == "PartyList":
+            item["party_name"] = r.party_name
 
-        out.append(item)
+    return item
 
-    return out
 
-@app.get("/ballots/count")
-def count_ballots(session: Session = Depends(get_session)):
-    total = session.exec(select(func.count(Ballot.ballot_id))).one()
-    return {"total_ballots": total}
+def _stream_ballots_ndjson(after: int | None, limit: int | None):
+    # เปิด session เองใน generator: session จาก Depends อาจถูกปิดก่อน stream จบ
+    statement = _ballots_statement(after, limit).execution_options(yield_per=STREAM_FETCH_SIZE)
+    with ExitStack() as stack:
+        sessions = [stack.enter_context(Session(e)) for e in sharding.data_engines()]
+        # แต่ละ shard เรียงตาม ballot_id อยู่แล้ว -> merge ทีละแถว (โหมดไฟล์เดียวมี stream เดียว)
+        rows = heapq.merge(*(s.exec(statement) for s in sessions), key=lambda r: r.ballot_id)
+        for r in itertools.islice(rows, limit):
+            yield fastjson.dumps(_ballot_item(r)) + b"\n"
 
-@app.get("/ballots/summary")
-def ballots_summary(session: Session = Depends(get_session)):
-    total = session.exec(select(func.count(Ballot.ballot_id))).one()
 
-    valid_count = session.exec(
-        select(func.count(Ballot.ballot_id)).where(Ballot.is_valid == True)
-    ).one()
+@app.get("/ballots")
+def get_ballots_final(
+    limit: int | None = Query(default=None, ge=1, le=MAX_PAGE_SIZE),
+    after: int | None = None,
+    format: Literal["json", "ndjson"] = "json",
+    session: Session = Depends(get_session),
+):
+    if format == "ndjson":
+        return StreamingResponse(
+            _stream_ballots_ndjson(after, limit),
+            media_type="application/x-ndjson",
+        )
 
-    invalid_count = session.exec(
-        select(func.count(Ballot.ballot_id)).where(Ballot.is_valid == False)
-    ).one()
+    rows = _exec_all(session, _ballots_statement(after, limit), lambda r: r.ballot_id, limit)
 
-    valid_const = session.exec(
-        select(func.count(Ballot.ballot_id)).where(
-            Ballot.is_valid == True, Ballot.vote_type == "Constituency"
-        )
-    ).one()
+    # หน้าเต็ม = อาจมีหน้าถัดไป
+    headers = {}
+    if limit is not None and len(rows) == limit:
+        headers["X-Next-After"] = str(rows[-1].ballot_id)
 
-    valid_party = session.exec(
-        select(func.count(Ballot.ballot_id)).where(
-            Ballot.is_valid == True, Ballot.vote_type == "PartyList"
-        )
-    ).one()
+    return FastJSONResponse([_ballot_item(r) for r in rows], headers=headers)
 
-    invalid_const = session.exec(
-        select(func.count(Ballot.ballot_id)).where(
-            Ballot.is_valid == False, Ballot.vote_type == "Constituency"
-        )
-    ).one()
+# ----- Export แบบ columnar (Arrow IPC / Parquet) สำหรับงานวิเคราะห์ -----
+
+@app.get("/ballots/export")
+def export_ballots(
+    format: Literal[export.FORMATS] = "parquet",
+    batch_size: int = Query(default=export.DEFAULT_BATCH_SIZE, ge=1_000, le=1_000_000),
+):
+    if not export.available():
+        raise HTTPException(status_code=503, detail="pyarrow not installed")
+
+    return StreamingResponse(
+        export.stream_ballots(format, batch_size),
+        media_type=export.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="ballots.{format}"'},
+    )
 
-    invalid_party = session.exec(
-        select(func.count(Ballot.ballot_id)).where(
-            Ballot.is_valid == False, Ballot.vote_type == "PartyList"
+
+# ----- นับบัตร: อ่านจาก BallotCounters (SELECT เดียว ไม่ scan Ballots) -----
+
+@app.get("/ballots/count")
+def count_ballots(request: Request, session: Session = Depends(get_results_session)):
+    return respcache.cached_json(request, session, lambda: _count_ballots(session))
+
+
+def _count_ballots(session: Session):
+    counts = tally.ballot_counts(session)
+    return {"total_ballots": sum(counts.values())}
+
+@app.get("/ballots/summary")
+def ballots_summary(request: Request, session: Session = Depends(get_results_session)):
+    return respcache.cached_json(request, session, lambda: _ballots_summary(session))
+
+
+def _ballots_summary(session: Session):
+    counts = tally.ballot_counts(session)
+
+    def total(vote_type=None, is_valid=None):
+        return sum(
+            n for (t, v), n in counts.items()
+            if (vote_type is None or t == vote_type) and (is_valid is None or v == is_valid)
         )
-    ).one()
 
     return {
-        "total_ballots": total,
-        "valid_ballots": valid_count,
-        "invalid_ballots": invalid_count,
-        "valid_constituency": valid_const,
-        "valid_partylist": valid_party,
-        "invalid_constituency": invalid_const,
-        "invalid_partylist": invalid_party,
+        "total_ballots": total(),
+        "valid_ballots": total(is_valid=True),
+        "invalid_ballots": total(is_valid=False),
+        "valid_constituency": total("Constituency", True),
+        "valid_partylist": total("PartyList", True),
+        "invalid_constituency": total("Constituency", False),
+        "invalid_partylist": total("PartyList", False),
     }
 
 @app.get("/ballots/validity-count")
-def ballots_validity_count(session: Session = Depends(get_session)):
-    good = session.exec(
-        select(func.count(Ballot.ballot_id)).where(Ballot.is_valid == True)
-    ).one()
+def ballots_validity_count(request: Request, session: Session = Depends(get_results_session)):
+    return respcache.cached_json(request, session, lambda: _ballots_validity_count(session))
+
+
+def _ballots_validity_count(session: Session):
+    counts = tally.ballot_counts(session)
 
-    bad = session.exec(
-        select(func.count(Ballot.ballot_id)).where(Ballot.is_valid == False)
-    ).one()
+    good = sum(n for (_, v), n in counts.items() if v)
+    bad = sum(n for (_, v), n in counts.items() if not v)
 
     return {
         "บัตรดี": good,
@@ -359,29 +842,48 @@ def ballots_validity_count(session: Session = Depends(get_session)):
 # =========================================================
 # Results (JOIN โชว์ชื่อไทย)
 # =========================================================
+# อ่านจาก tally table (ConstituencyTallies / PartyTallies) แทนการ scan Ballots
+# -> ต้นทุนขึ้นกับจำนวนผู้สมัคร/พรรค ไม่ใช่จำนวนบัตร
+# response ถูก cache ตาม results version + ส่ง ETag (poll ซ้ำโดยไม่มีอะไรเปลี่ยน = 304)
+
+@app.get("/results/stream")
+async def results_stream():
+    """
+    Server-Sent Events: event "snapshot" (ยอดทั้งหมด) 1 ครั้ง แล้วตามด้วย event "delta"
+    ทุกครั้งที่มี ballot ใหม่จาก process ไหนก็ได้ (เช็ค ResultsVersions รอบละ live.FLUSH_INTERVAL วินาที)
+    """
+    return StreamingResponse(
+        live.subscribe(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.get("/results/constituency")
-def results_constituency_by_district(session: Session = Depends(get_session)):
+def results_constituency_by_district(request: Request, session: Session = Depends(get_results_session)):
+    return respcache.cached_json(request, session, lambda: _results_constituency_by_district(session))
+
+
+def _results_constituency_by_district(session: Session):
+    total_votes = func.sum(ConstituencyTally.votes)
     statement = (
         select(
             Constituency.const_number.label("const_number"),
             Candidate.full_name.label("candidate_name"),
             Party.party_name.label("party_name"),
-            func.count(Ballot.ballot_id).label("total_votes"),
+            total_votes.label("total_votes"),
         )
-        .select_from(Ballot)
-        .join(Constituency, Constituency.const_id == Ballot.const_id)
-        .join(Candidate, Candidate.candidate_id == Ballot.candidate_id)
+        .select_from(ConstituencyTally)
+        .join(Constituency, Constituency.const_id == ConstituencyTally.const_id)
+        .join(Candidate, Candidate.candidate_id == ConstituencyTally.candidate_id)
         .join(Party, Party.party_id == Candidate.party_id)
-        .where(
-            Ballot.vote_type == "Constituency",
-            Ballot.is_valid == True
-        )
+        .where(ConstituencyTally.votes > 0)
         .group_by(
             Constituency.const_number,
             Candidate.full_name,
             Party.party_name,
         )
-        .order_by(Constituency.const_number, func.count(Ballot.ballot_id).desc())
+        .order_by(Constituency.const_number, total_votes.desc())
     )
 
     rows = session.exec(statement).all()
@@ -395,26 +897,81 @@ def results_constituency_by_district(session: Session = Depends(get_session)):
         for r in rows
     ]
 
-@app.get("/results/party")
-def results_party_by_district(session: Session = Depends(get_session)):
+@app.get("/results/constituency/winners")
+def results_constituency_winners(request: Request, session: Session = Depends(get_results_session)):
+    return respcache.cached_json(request, session, lambda: _results_constituency_winners(session))
+
+
+def _results_constituency_winners(session: Session):
+    # window function บน tally: อันดับ 1 ของแต่ละเขต + คะแนนอันดับ 2 (lead) ใน query เดียว
+    # -> ได้ 1 แถวต่อเขต ไม่ต้องส่งผู้สมัครทุกคนไปเรียงต่อฝั่ง client
+    window = {
+        "partition_by": ConstituencyTally.const_id,
+        "order_by": (ConstituencyTally.votes.desc(), ConstituencyTally.candidate_id),
+    }
+    ranked = (
+        select(
+            ConstituencyTally.const_id,
+            ConstituencyTally.candidate_id,
+            ConstituencyTally.votes,
+            func.row_number().over(**window).label("rank"),
+            func.lead(ConstituencyTally.votes, 1, 0).over(**window).label("runner_up_votes"),
+        )
+        .where(ConstituencyTally.votes > 0)
+        .subquery()
+    )
     statement = (
         select(
             Constituency.const_number.label("const_number"),
+            Candidate.full_name.label("candidate_name"),
             Party.party_name.label("party_name"),
-            func.count(Ballot.ballot_id).label("total_votes"),
+            ranked.c.votes,
+            ranked.c.runner_up_votes,
         )
-        .select_from(Ballot)
-        .join(Constituency, Constituency.const_id == Ballot.const_id)
-        .join(Party, Party.party_id == Ballot.party_id)
-        .where(
-            Ballot.vote_type == "PartyList",
-            Ballot.is_valid == True
+        .select_from(ranked)
+        .join(Constituency, Constituency.const_id == ranked.c.const_id)
+        .join(Candidate, Candidate.candidate_id == ranked.c.candidate_id)
+        .join(Party, Party.party_id == Candidate.party_id)
+        .where(ranked.c.rank == 1)
+        .order_by(Constituency.const_number)
+    )
+
+    rows = session.exec(statement).all()
+    return [
+        {
+            "เขต": f"เขต{r.const_number}",
+            "ผู้ชนะ": r.candidate_name,
+            "พรรค": r.party_name,
+            "คะแนน": r.votes,
+            "คะแนนห่าง": r.votes - r.runner_up_votes,
+            # คะแนนเท่ากับอันดับ 2 -> ยังตัดสินไม่ได้ (ผู้ชนะที่แสดงเป็นแค่ลำดับ candidate_id)
+            "คะแนนเท่ากัน": r.votes == r.runner_up_votes,
+        }
+        for r in rows
+    ]
+
+@app.get("/results/party")
+def results_party_by_district(request: Request, session: Session = Depends(get_results_session)):
+    return respcache.cached_json(request, session, lambda: _results_party_by_district(session))
+
+
+def _results_party_by_district(session: Session):
+    total_votes = func.sum(PartyTally.votes)
+    statement = (
+        select(
+            Constituency.const_number.label("const_number"),
+            Party.party_name.label("party_name"),
+            total_votes.label("total_votes"),
         )
+        .select_from(PartyTally)
+        .join(Constituency, Constituency.const_id == PartyTally.const_id)
+        .join(Party, Party.party_id == PartyTally.party_id)
+        .where(PartyTally.votes > 0)
         .group_by(
             Constituency.const_number,
             Party.party_name,
         )
-        .order_by(Constituency.const_number, func.count(Ballot.ballot_id).desc())
+        .order_by(Constituency.const_number, total_votes.desc())
     )
 
     rows = session.exec(statement).all()
@@ -428,22 +985,24 @@ def results_party_by_district(session: Session = Depends(get_session)):
     ]
 
 @app.get("/results/constituency/overall")
-def results_constituency_overall(session: Session = Depends(get_session)):
+def results_constituency_overall(request: Request, session: Session = Depends(get_results_session)):
+    return respcache.cached_json(request, session, lambda: _results_constituency_overall(session))
+
+
+def _results_constituency_overall(session: Session):
+    total_votes = func.sum(ConstituencyTally.votes)
     statement = (
         select(
             Candidate.full_name.label("candidate_name"),
             Party.party_name.label("party_name"),
-            func.count(Ballot.ballot_id).label("total_votes"),
+            total_votes.label("total_votes"),
         )
-        .select_from(Ballot)
-        .join(Candidate, Candidate.candidate_id == Ballot.candidate_id)
+        .select_from(ConstituencyTally)
+        .join(Candidate, Candidate.candidate_id == ConstituencyTally.candidate_id)
         .join(Party, Party.party_id == Candidate.party_id)
-        .where(
-            Ballot.vote_type == "Constituency",
-            Ballot.is_valid == True
-        )
+        .where(ConstituencyTally.votes > 0)
         .group_by(Candidate.full_name, Party.party_name)
-        .order_by(func.count(Ballot.ballot_id).desc())
+        .order_by(total_votes.desc())
     )
 
     rows = session.exec(statement).all()
@@ -451,21 +1010,203 @@ def results_constituency_overall(session: Session = Depends(get_session)):
 
 
 @app.get("/results/party/overall")
-def results_party_overall(session: Session = Depends(get_session)):
+def results_party_overall(request: Request, session: Session = Depends(get_results_session)):
+    return respcache.cached_json(request, session, lambda: _results_party_overall(session))
+
+
+def _results_party_overall(session: Session):
+    total_votes = func.sum(PartyTally.votes)
     statement = (
         select(
             Party.party_name.label("party_name"),
-            func.count(Ballot.ballot_id).label("total_votes"),
-        )
-        .select_from(Ballot)
-        .join(Party, Party.party_id == Ballot.party_id)
-        .where(
-            Ballot.vote_type == "PartyList",
-            Ballot.is_valid == True
+            total_votes.label("total_votes"),
         )
+        .select_from(PartyTally)
+        .join(Party, Party.party_id == PartyTally.party_id)
+        .where(PartyTally.votes > 0)
         .group_by(Party.party_name)
-        .order_by(func.count(Ballot.ballot_id).desc())
+        .order_by(total_votes.desc())
+    )
+
+    rows = session.exec(statement).all()
+    return [{"พรรค": r.party_name, "คะแนน": r.total_votes} for r in rows]
+
+
+# ----- จัดสรรที่นั่งบัญชีรายชื่อจากคะแนนพรรครวม -----
+
+@app.get("/results/party/seats")
+def results_party_seats(
+    request: Request,
+    seats: int = Query(default=100, ge=0, le=10_000),
+    method: Literal[SEAT_METHODS] = "dhondt",
+    threshold: float = Query(default=0.0, ge=0, lt=1),
+    session: Session = Depends(get_results_session),
+):
+    if not seats_available():
+        raise HTTPException(status_code=503, detail="numpy not installed")
+
+    return respcache.cached_json(
+        request, session, lambda: _results_party_seats(session, seats, method, threshold)
+    )
+
+
+def _results_party_seats(session: Session, seats: int, method: str, threshold: float):
+    total_votes = func.sum(PartyTally.votes)
+    statement = (
+        select(
+            Party.party_name.label("party_name"),
+            total_votes.label("total_votes"),
+        )
+        .select_from(PartyTally)
+        .join(Party, Party.party_id == PartyTally.party_id)
+        .where(PartyTally.votes > 0)
+        .group_by(Party.party_id, Party.party_name)
+        .order_by(total_votes.desc(), Party.party_id)
     )
 
     rows = session.exec(statement).all()
-    return [{"พรรค": r.party_name, "คะแนน": r.total_votes} for r in rows]
\ No newline at end of file
+    allocation = allocate_seats([r.total_votes for r in rows], seats, method, threshold)
+    return [
+        {"พรรค": r.party_name, "คะแนน": r.total_votes, "ที่นั่ง": int(n)}
+        for r, n in zip(rows, allocation)
+    ]
+
+
+# =========================================================
+# Turnout (ผู้มาใช้สิทธิ เทียบกับผู้มีสิทธิ)
+# =========================================================
+# อ่านจาก TurnoutTallies (นับตอน flag has_voted_* เปลี่ยน) ไม่ต้อง COUNT Voters ทุก request
+# ผู้มีสิทธิ = Constituency.total_eligible_voters (รวมเป็นภาค/ประเทศ)
+# ร้อยละเป็น null ถ้ายังไม่ได้ตั้งจำนวนผู้มีสิทธิ (= 0)
+
+def _turnout_item(counts: dict, eligible: int) -> dict:
+    item = {"ผู้มีสิทธิ": eligible}
+    for vote_type, label in (("Constituency", "บัตรเขต"), ("PartyList", "บัตรพรรค")):
+        voted = counts.get(vote_type, 0)
+        item[label] = {
+            "มาใช้สิทธิ": voted,
+            "ร้อยละ": round(voted * 100 / eligible, 2) if eligible else None,
+        }
+    return item
+
+
+def _turnout_rows(session: Session):
+    """คืน (เขตทั้งหมด + ภาค, {const_id: {vote_type: voters}})"""
+    consts = session.exec(
+        select(
+            Constituency.const_id,
+            Constituency.const_number,
+            Constituency.total_eligible_voters,
+            Region.region_id,
+            Region.name_th,
+        )
+        .join(Region, Region.region_id == Constituency.region_id)
+        .order_by(Region.region_id, Constituency.const_number)
+    ).all()
+
+    voted: dict = {}
+    for (const_id, vote_type), n in tally.turnout_counts(session).items():
+        voted.setdefault(const_id, Counter())[vote_type] += n
+    return consts, voted
+
+
+@app.get("/turnout")
+def turnout_national(request: Request, session: Session = Depends(get_results_session)):
+    return respcache.cached_json(request, session, lambda: _turnout_national(session))
+
+
+def _turnout_national(session: Session):
+    consts, voted = _turnout_rows(session)
+    total = sum((voted.get(c.const_id, Counter()) for c in consts), Counter())
+    return {
+        "ประชากร": session.exec(select(func.coalesce(func.sum(Region.total_population), 0))).one(),
+        **_turnout_item(total, sum(c.total_eligible_voters for c in consts)),
+    }
+
+
+@app.get("/turnout/region")
+def turnout_by_region(request: Request, session: Session = Depends(get_results_session)):
+    return respcache.cached_json(request, session, lambda: _turnout_by_region(session))
+
+
+def _turnout_by_region(session: Session):
+    consts, voted = _turnout_rows(session)
+    regions = session.exec(
+        select(Region.region_id, Region.name_th, Region.total_population).order_by(Region.region_id)
+    ).all()
+
+    counts = {r.region_id: Counter() for r in regions}
+    eligible = {r.region_id: 0 for r in regions}
+    for c in consts:
+        counts[c.region_id].update(voted.get(c.const_id, {}))
+        eligible[c.region_id] += c.total_eligible_voters
+
+    return [
+        {
+            "ภาค": r.name_th,
+            "ประชากร": r.total_population,
+            **_turnout_item(counts[r.region_id], eligible[r.region_id]),
+        }
+        for r in regions
+    ]
+
+
+@app.get("/turnout/constituency")
+def turnout_by_constituency(request: Request, session: Session = Depends(get_results_session)):
+    return respcache.cached_json(request, session, lambda: _turnout_by_constituency(session))
+
+
+def _turnout_by_constituency(session: Session):
+    consts, voted = _turnout_rows(session)
+    return [
+        {
+            "ภาค": c.name_th,
+            "เขต": f"เขต{c.const_number}",
+            **_turnout_item(voted.get(c.const_id, {}), c.total_eligible_voters),
+        }
+        for c in consts
+    ]
+
+
+# =========================================================
+# Async variants (/async/...)
+# =========================================================
+# รันบน event loop ผ่าน async engine (aiosqlite / asyncpg) ไม่ต้องแย่ง threadpool
+# logic เดียวกับ endpoint แบบ sync: ใช้ AsyncSession.run_sync เรียกฟังก์ชันเดิม
+
+def require_single_database() -> None:
+    # async engine ชี้ไปที่ DATABASE_URL อย่างเดียว -> โหมด shard ใช้ได้แค่ endpoint แบบ sync
+    if sharding.enabled():
+        raise HTTPException(status_code=503, detail="Async endpoints are not available in sharded mode")
+
+
+@app.post("/async/ballots", dependencies=[Depends(require_single_database)])
+async def create_ballot_async(ballot: Ballot, session: AsyncSession = Depends(get_async_session)):
+    return await session.run_sync(lambda s: create_ballot(ballot, s))
+
+
+@app.post("/async/ballots/batch", dependencies=[Depends(require_single_database)])
+async def create_ballots_batch_async(ballots: List[Ballot], session: AsyncSession = Depends(get_async_session)):
+    return await session.run_sync(lambda s: create_ballots_batch(ballots, s))
+
+
+def _async_read_endpoint(handler):
+    async def endpoint(request: Request, session: AsyncSession = Depends(get_async_session)):
+        return await session.run_sync(lambda s: handler(request=request, session=s))
+
+    endpoint.__name__ = f"{handler.__name__}_async"
+    return endpoint
+
+
+for _path, _handler in [
+    ("/ballots/summary", ballots_summary),
+    ("/results/constituency", results_constituency_by_district),
+    ("/results/party", results_party_by_district),
+    ("/results/constituency/overall", results_constituency_overall),
+    ("/results/constituency/winners", results_constituency_winners),
+    ("/results/party/overall", results_party_overall),
+    ("/turnout", turnout_national),
+    ("/turnout/region", turnout_by_region),
+    ("/turnout/constituency", turnout_by_constituency),
+]:
+    app.get("/async" + _path, dependencies=[Depends(require_single_database)])(_async_read_endpoint(_handler))
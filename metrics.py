@@ -0,0 +1,206 @@
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+
+from tally import VOTE_TYPES
+
+
+# =========================
+# Prometheus-style metrics (ไม่ต้องพึ่ง prometheus_client)
+# =========================
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+_registry: list = []
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: dict = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(labels[n] for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._values: dict = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(labels[n] for n in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        for key, state in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, state):
+                cumulative += n
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            inf = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, inf)} {state[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {state[-1]}")
+        return lines
+
+
+def render() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# =========================
+# Metrics ของระบบ
+# =========================
+
+http_requests_total = Counter(
+    "http_requests_total", "HTTP requests by route and status", ("method", "route", "status"),
+)
+http_request_errors_total = Counter(
+    "http_request_errors_total", "HTTP requests that ended in 5xx or an exception", ("method", "route"),
+)
+http_request_duration_seconds = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("method", "route"),
+)
+db_queries_total = Counter(
+    "db_queries_total", "SQL statements executed", ("route",),
+)
+db_query_duration_seconds = Histogram(
+    "db_query_duration_seconds", "SQL statement latency", ("route",),
+)
+db_queries_per_request = Histogram(
+    "db_queries_per_request", "SQL statements per HTTP request", ("route",), buckets=COUNT_BUCKETS,
+)
+ballots_accepted_total = Counter(
+    "ballots_accepted_total", "Ballots stored", ("vote_type", "validity"),
+)
+ballots_rejected_total = Counter(
+    "ballots_rejected_total", "Ballots refused (e.g. already voted)", ("vote_type", "reason"),
+)
+
+
+def _vote_type_label(vote_type) -> str:
+    # vote_type มาจาก client -> จำกัดค่า label ไม่ให้ cardinality บาน
+    return vote_type if vote_type in VOTE_TYPES else "Other"
+
+
+def record_ballot_accepted(vote_type, is_valid: bool) -> None:
+    ballots_accepted_total.inc(
+        vote_type=_vote_type_label(vote_type), validity="valid" if is_valid else "invalid",
+    )
+
+
+def record_ballot_rejected(vote_type, reason: str) -> None:
+    ballots_rejected_total.inc(vote_type=_vote_type_label(vote_type), reason=reason)
+
+
+# =========================
+# Per-request SQL tracking (engine events)
+# =========================
+
+class _RequestStats:
+    __slots__ = ("queries", "durations")
+
+    def __init__(self):
+        self.queries = 0
+        self.durations: list = []
+
+
+# ตั้งใน middleware; thread ของ sync endpoint ได้ context นี้ต่อไปด้วย
+_request_stats: ContextVar[Optional[_RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["metrics_query_start"].pop()
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.durations.append(elapsed)
+    else:
+        # query นอก request (startup, CLI)
+        db_queries_total.inc(route="-")
+        db_query_duration_seconds.observe(elapsed, route="-")
+
+
+def instrument_engine(engine) -> None:
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def start_request() -> tuple:
+    stats = _RequestStats()
+    token = _request_stats.set(stats)
+    return stats, token
+
+
+def finish_request(stats: _RequestStats, token, method: str, route: str, status: int, elapsed: float) -> None:
+    _request_stats.reset(token)
+
+    http_requests_total.inc(method=method, route=route, status=str(status))
+    http_request_duration_seconds.observe(elapsed, method=method, route=route)
+    if status >= 500:
+        http_request_errors_total.inc(method=method, route=route)
+
+    db_queries_per_request.observe(stats.queries, route=route)
+    if stats.queries:
+        db_queries_total.inc(stats.queries, route=route)
+        for d in stats.durations:
+            db_query_duration_seconds.observe(d, route=route)
@@ -1,6 +1,7 @@
 from typing import Optional
 from datetime import datetime, timezone
 from sqlmodel import SQLModel, Field
+from sqlalchemy import Index
 
 
 
@@ -63,6 +64,10 @@ class Candidate(SQLModel, table=True):
 
 class Voter(SQLModel, table=True):
     __tablename__ = "Voters"
+    __table_args__ = (
+        # GET /voters?const_id=...&after=... (ดึงเฉพาะเขตตัวเองทีละหน้า)
+        Index("ix_Voters_const_id_voter_id", "const_id", "voter_id"),
+    )
 
     voter_id: Optional[int] = Field(default=None, primary_key=True)
     citizen_id: str = Field(unique=True, index=True)
@@ -79,6 +84,11 @@ class Voter(SQLModel, table=True):
 
 class Ballot(SQLModel, table=True):
     __tablename__ = "Ballots"
+    __table_args__ = (
+        # covering index ของ GROUP BY ผลคะแนน (rebuild tally / นับบัตร) -> index-only scan
+        Index("ix_Ballots_type_valid_const_candidate", "vote_type", "is_valid", "const_id", "candidate_id"),
+        Index("ix_Ballots_type_valid_const_party", "vote_type", "is_valid", "const_id", "party_id"),
+    )
 
     ballot_id: Optional[int] = Field(default=None, primary_key=True)
 
@@ -96,4 +106,52 @@ class Ballot(SQLModel, table=True):
 
     vote_type: str
     is_valid: bool = Field(default=True)
-    voted_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
\ No newline at end of file
+    voted_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+# =========================
+# 7. Tallies (ตัวนับคะแนนที่อัปเดตพร้อมกับการลง ballot)
+# =========================
+
+class ConstituencyTally(SQLModel, table=True):
+    __tablename__ = "ConstituencyTallies"
+
+    const_id: int = Field(foreign_key="Constituencies.const_id", primary_key=True)
+    candidate_id: int = Field(foreign_key="Candidates.candidate_id", primary_key=True)
+    votes: int = Field(default=0)  # เฉพาะบัตรดี
+
+
+class PartyTally(SQLModel, table=True):
+    __tablename__ = "PartyTallies"
+
+    const_id: int = Field(foreign_key="Constituencies.const_id", primary_key=True)
+    party_id: int = Field(foreign_key="Parties.party_id", primary_key=True)
+    votes: int = Field(default=0)  # เฉพาะบัตรดี
+
+
+class BallotCounter(SQLModel, table=True):
+    __tablename__ = "BallotCounters"
+
+    # vote_type ที่ไม่รู้จักจะถูกรวมเป็น "Other"
+    vote_type: str = Field(primary_key=True)
+    is_valid: bool = Field(primary_key=True)
+    ballots: int = Field(default=0)  # นับทั้งบัตรดีและบัตรเสีย
+
+
+class TurnoutTally(SQLModel, table=True):
+    __tablename__ = "TurnoutTallies"
+
+    # เขตของ voter (ไม่ใช่เขตที่เขียนบน ballot) -> เทียบกับ total_eligible_voters ของเขตนั้นได้ตรง
+    const_id: int = Field(foreign_key="Constituencies.const_id", primary_key=True)
+    vote_type: str = Field(primary_key=True)  # Constituency / PartyList
+    voters: int = Field(default=0)  # จำนวนคนที่ใช้สิทธิแล้ว (has_voted_* = 1)
+
+
+class ResultsVersion(SQLModel, table=True):
+    __tablename__ = "ResultsVersions"
+
+    # name = "results": เพิ่มขึ้นใน transaction เดียวกับทุกการเปลี่ยนผลคะแนน/turnout/ข้อมูลอ้างอิง
+    # name = "voters": เพิ่มตามจำนวน voter ที่ insert (transaction เดียวกับ insert)
+    # -> ทุก process (หลาย worker / หลาย instance บน db เดียวกัน) เห็น version เดียวกัน
+    name: str = Field(primary_key=True)
+    version: int = Field(default=0)
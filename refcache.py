@@ -0,0 +1,112 @@
+import threading
+import time
+from typing import NamedTuple, Optional
+
+from sqlmodel import Session, select
+
+from models import Region, Constituency, Party, Candidate
+
+
+# =========================
+# Reference-data cache (Regions / Constituencies / Parties / Candidates)
+# =========================
+# ตารางพวกนี้เล็กและแทบไม่เปลี่ยนระหว่างลงคะแนน -> เก็บไว้ใน memory
+# ตรวจ ballot ได้โดยไม่ต้องยิง SQL เพิ่ม
+# POST ที่แก้ตารางเหล่านี้ต้องเรียก invalidate() หลัง commit
+
+# ถ้าหา key ไม่เจอ และ snapshot เก่ากว่านี้ (วินาที) -> โหลดใหม่ 1 ครั้ง
+# กันกรณีข้อมูลถูกเพิ่มจาก process/worker อื่น
+MISS_RELOAD_INTERVAL = 1.0
+
+
+class CandidateRef(NamedTuple):
+    const_id: int
+    party_id: int
+    full_name: str
+
+
+class ConstituencyRef(NamedTuple):
+    region_id: int
+    const_number: int
+
+
+class RefSnapshot(NamedTuple):
+    version: int
+    loaded_at: float
+    regions: dict        # region_id -> name_th
+    constituencies: dict  # const_id -> ConstituencyRef
+    parties: dict        # party_id -> party_name
+    candidates: dict     # candidate_id -> CandidateRef
+
+
+_version = 0
+_version_lock = threading.Lock()
+_load_lock = threading.Lock()
+_snapshot: Optional[RefSnapshot] = None
+
+
+def invalidate() -> None:
+    """เพิ่ม version -> snapshot ปัจจุบันหมดอายุ (โหลดใหม่ตอนใช้งานครั้งถัดไป)"""
+    global _version
+    with _version_lock:
+        _version += 1
+
+
+def version() -> int:
+    return _version
+
+
+def get(session: Session) -> RefSnapshot:
+    global _snapshot
+
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == _version:
+        return snapshot
+
+    with _load_lock:
+        snapshot = _snapshot
+        if snapshot is not None and snapshot.version == _version:
+            return snapshot
+
+        # จำ version ก่อนโหลด: ถ้ามี invalidate ระหว่างโหลด snapshot นี้จะถูกโหลดใหม่รอบหน้า
+        loading_version = _version
+        _snapshot = RefSnapshot(
+            version=loading_version,
+            loaded_at=time.monotonic(),
+            regions={
+                r.region_id: r.name_th
+                for r in session.exec(select(Region.region_id, Region.name_th))
+            },
+            constituencies={
+                r.const_id: ConstituencyRef(r.region_id, r.const_number)
+                for r in session.exec(
+                    select(Constituency.const_id, Constituency.region_id, Constituency.const_number)
+                )
+            },
+            parties={
+                r.party_id: r.party_name
+                for r in session.exec(select(Party.party_id, Party.party_name))
+            },
+            candidates={
+                r.candidate_id: CandidateRef(r.const_id, r.party_id, r.full_name)
+                for r in session.exec(
+                    select(Candidate.candidate_id, Candidate.const_id, Candidate.party_id, Candidate.full_name)
+                )
+            },
+        )
+        return _snapshot
+
+
+def lookup(session: Session, table: str, key):
+    """
+    หา key ในตาราง reference ("regions" / "constituencies" / "parties" / "candidates")
+    ไม่เจอ = None
+    """
+    snapshot = get(session)
+    value = getattr(snapshot, table).get(key)
+
+    if value is None and time.monotonic() - snapshot.loaded_at > MISS_RELOAD_INTERVAL:
+        invalidate()
+        value = getattr(get(session), table).get(key)
+
+    return value
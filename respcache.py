@@ -0,0 +1,102 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from fastapi import Request, Response
+from sqlmodel import Session
+
+from database import engine
+import fastjson
+import sharding
+import tally
+
+
+# =========================
+# Cached result snapshots + ETag
+# =========================
+# ผลคะแนน/สรุปบัตรเปลี่ยนเฉพาะตอนมี ballot ใหม่ (หรือข้อมูลอ้างอิงเปลี่ยน)
+# -> เก็บ JSON ที่ serialize แล้วไว้ตาม "results version"
+# version อ่านจากตาราง ResultsVersions (เพิ่มใน transaction เดียวกับ ballot) ไม่ใช่ตัวนับใน process
+# -> หลาย worker / หลาย instance บน db เดียวกันเห็น version ตรงกัน ไม่มีใครตอบ body เก่าค้าง
+# client ที่ส่ง If-None-Match ตรงกับ version ปัจจุบันได้ 304 ทันที (SQL แค่อ่าน version 1 แถว ไม่มี serialize)
+
+# จำนวน response ที่เก็บไว้ (LRU) -> ชุด parameter แปลก ๆ (seats/threshold) ไม่ทำให้ cache โตไม่หยุด
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+
+_lock = threading.Lock()
+_cache: OrderedDict = OrderedDict()  # (route, params) -> (version, body bytes)
+
+
+def current_version(session: Optional[Session] = None) -> str:
+    """
+    ผลรวม version ของทุก database ที่มีการเขียน (แต่ละตัวเพิ่มขึ้นอย่างเดียว -> ผลรวมก็เช่นกัน)
+    โหมดปกติ: อ่านผ่าน session ที่ส่งมา (endpoint /async/* = AsyncSession.run_sync -> ไม่ block event loop)
+    โหมด shard: ทุก shard + catalog (ข้อมูลอ้างอิง) ด้วย engine ของแต่ละตัว (/async ปิดอยู่ในโหมดนี้)
+    """
+    if session is not None and not sharding.enabled():
+        return str(tally.results_version(session))
+
+    version = sum(sharding.scatter(tally.results_version))
+    if sharding.enabled():
+        with Session(engine) as session:
+            version += tally.results_version(session)
+    return str(version)
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [t.strip() for t in header.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def _cache_key(request: Request) -> tuple:
+    # path template ของ route + เฉพาะ query parameter ที่ endpoint ประกาศไว้ (parameter อื่นไม่มีผลกับ body)
+    route = request.scope.get("route")
+    if route is None:
+        return (request.url.path, request.url.query)
+    params = tuple(
+        request.query_params.get(p.alias) for p in route.dependant.query_params
+    )
+    return (route.path, params)
+
+
+def _get(key: tuple, version: str):
+    with _lock:
+        entry = _cache.get(key)
+        if entry is None or entry[0] != version:
+            return None
+        _cache.move_to_end(key)
+        return entry[1]
+
+
+def _put(key: tuple, version: str, body: bytes) -> None:
+    with _lock:
+        _cache[key] = (version, body)
+        _cache.move_to_end(key)
+        while len(_cache) > RESPONSE_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def cached_json(request: Request, session: Session, build: Callable[[], object]) -> Response:
+    """
+    คืน JSON ของ build() โดย cache ตาม results version
+    session = session ของ request (ใช้อ่าน version)
+    ต้องอ่าน version ก่อน build: ถ้ามี ballot เข้ามาระหว่าง build จะถูกเก็บไว้ใต้ version เก่า (ไม่ถูกใช้อีก)
+    """
+    version = current_version(session)
+    etag = f'"{version}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    key = _cache_key(request)
+    body = _get(key, version)
+    if body is None:
+        body = fastjson.dumps(build())
+        _put(key, version, body)
+
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,199 @@
+import sys
+from fractions import Fraction
+
+try:
+    import numpy as np
+except ImportError:  # optional: pip install numpy (ไม่มี -> /results/party/seats ตอบ 503)
+    np = None
+
+
+# =========================
+# Party-list seat allocation (vectorized)
+# =========================
+# votes เป็น array (P,) = ผลจริง 1 ชุด หรือ (S, P) = S สถานการณ์จำลองพร้อมกัน
+# คืน array จำนวนที่นั่ง (int64) shape เดียวกับ votes
+# ทุกวิธีคำนวณทุกแถวพร้อมกันด้วย numpy (ไม่มี loop ต่อแถว)
+# คะแนนเท่ากันพอดี -> พรรคที่อยู่ก่อน (index น้อยกว่า) ได้ก่อน
+
+METHODS = ("dhondt", "sainte-lague", "hare", "droop")
+
+
+def available() -> bool:
+    return np is not None
+
+# ตัวหาร d(s) = s + offset  (s = จำนวนที่นั่งที่ได้ไปแล้ว)
+_DIVISOR_OFFSET = {
+    "dhondt": 1.0,        # 1, 2, 3, ...
+    "sainte-lague": 0.5,  # 1, 3, 5, ... (หาร 2 ทั้งชุด ลำดับเหมือนกัน)
+}
+
+
+def allocate(votes, seats: int, method: str = "dhondt", threshold: float = 0.0) -> "np.ndarray":
+    """
+    threshold = สัดส่วนคะแนนขั้นต่ำ (เช่น 0.05) พรรคที่ต่ำกว่าไม่ได้ที่นั่ง
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown method: {method!r} (use one of {', '.join(METHODS)})")
+    if seats < 0:
+        raise ValueError("seats must be >= 0")
+
+    v = np.asarray(votes, dtype=np.float64)
+    one_d = v.ndim == 1
+    v = np.atleast_2d(v)
+    if v.ndim != 2:
+        raise ValueError("votes must be 1-D (parties) or 2-D (scenarios x parties)")
+    if (v < 0).any():
+        raise ValueError("votes must be >= 0")
+
+    if threshold > 0:
+        total = v.sum(axis=1, keepdims=True)
+        v = np.where(v >= threshold * total, v, 0.0)
+
+    if method in _DIVISOR_OFFSET:
+        out = highest_averages(v, seats, _DIVISOR_OFFSET[method])
+    else:
+        out = largest_remainder(v, seats, quota=method)
+
+    return out[0] if one_d else out
+
+
+def highest_averages(votes: "np.ndarray", seats: int, offset: float) -> "np.ndarray":
+    """
+    D'Hondt (offset=1) / Sainte-Laguë (offset=0.5)
+
+    แทนการไล่แจกทีละที่นั่ง (k รอบ): เริ่มจากตัวหารร่วม lam แบบ closed-form
+    ที่รับประกันว่าผลเริ่มต้นเป็นส่วนหนึ่งของคำตอบจริงและขาดอีกไม่เกิน P ที่นั่ง
+    แล้วแจกส่วนที่เหลือแบบ greedy (ไม่เกิน P รอบ) -> O(S * P^2) ไม่ขึ้นกับจำนวนที่นั่ง
+    """
+    v = np.asarray(votes, dtype=np.float64)
+    n_rows, n_parties = v.shape
+    alloc = np.zeros((n_rows, n_parties), dtype=np.int64)
+    total = v.sum(axis=1)
+    active = total > 0
+    if seats == 0 or n_parties == 0 or not active.any():
+        return alloc
+
+    # จำนวนที่นั่งที่ได้เมื่อใช้ตัวหาร lam: #{s >= 0 : v / (s + offset) > lam} = ceil(v/lam - offset)
+    # ผลรวม < V/lam - P*offset + P  -> เลือก lam = V / (k + P*offset - P) ได้ผลรวม < k เสมอ
+    # (ยังไม่เกินคำตอบจริง) และ >= k - P
+    denom = seats + n_parties * offset - n_parties
+    if denom > 0:
+        lam = np.where(active, total / denom, 1.0)
+        start = np.ceil(v / lam[:, None] - offset)
+        alloc = np.clip(start, 0, None).astype(np.int64)
+        alloc[~active] = 0
+
+    remaining = np.where(active, seats - alloc.sum(axis=1), 0)
+    rows = np.arange(n_rows)
+    while (remaining > 0).any():
+        quotient = v / (alloc + offset)
+        best = quotient.argmax(axis=1)
+        give = remaining > 0
+        alloc[rows[give], best[give]] += 1
+        remaining -= give
+
+    return alloc
+
+
+def largest_remainder(votes: "np.ndarray", seats: int, quota: str = "hare") -> "np.ndarray":
+    """
+    Hare: quota = V / k
+    Droop: quota = floor(V / (k + 1)) + 1
+    ได้ floor(v / quota) ก่อน แล้วที่นั่งที่เหลือให้พรรคที่เศษมากที่สุด
+    """
+    v = np.asarray(votes, dtype=np.float64)
+    n_rows, n_parties = v.shape
+    total = v.sum(axis=1)
+    active = total > 0
+    if seats == 0 or n_parties == 0 or not active.any():
+        return np.zeros((n_rows, n_parties), dtype=np.int64)
+
+    # share = v / quota เขียนเป็นเศษส่วน numer / denom (denom เท่ากันทั้งแถว)
+    # Hare: v*k / V   Droop: v / quota
+    if quota == "hare":
+        numer, denom = v * seats, total
+    elif quota == "droop":
+        numer, denom = v, np.floor(total / (seats + 1)) + 1
+    else:
+        raise ValueError(f"Unknown quota: {quota!r}")
+    denom = np.where(active, denom, 1.0)[:, None]
+
+    if (v == np.floor(v)).all():
+        # คะแนนเป็นจำนวนเต็ม -> หารด้วยเลขจำนวนเต็ม เศษที่เท่ากันจริงต้องเท่ากัน (float ปัดเศษไม่ตรงกัน)
+        numer, denom = numer.astype(np.int64), denom.astype(np.int64)
+        base, remainder = np.divmod(numer, denom)
+    else:
+        share = numer / denom
+        base = np.floor(share)
+        remainder = share - base
+    left = np.clip(seats - base.sum(axis=1), 0, n_parties)
+    left = np.where(active, left, 0)
+
+    # rank ของเศษในแต่ละแถว (0 = มากสุด), stable -> เท่ากันให้ index น้อยก่อน
+    order = np.argsort(-remainder, axis=1, kind="stable")
+    rank = np.empty_like(order)
+    np.put_along_axis(rank, order, np.arange(n_parties)[None, :].repeat(n_rows, axis=0), axis=1)
+
+    return (base + (rank < left[:, None])).astype(np.int64)
+
+
+# =========================
+# Reference (ตรวจผล): แจกทีละที่นั่งตามนิยาม ด้วยเลขเศษส่วนแม่นยำ
+# =========================
+
+def reference_allocate(votes: list, seats: int, method: str = "dhondt", threshold: float = 0.0) -> list:
+    """แบบตรงไปตรงมา (ช้า) สำหรับเทียบกับ allocate ทีละชุด"""
+    total = sum(votes)
+    if threshold > 0:
+        votes = [v if v >= threshold * total else 0 for v in votes]
+        total = sum(votes)
+    alloc = [0] * len(votes)
+    if seats == 0 or total == 0:
+        return alloc
+
+    if method in _DIVISOR_OFFSET:
+        offset = Fraction(_DIVISOR_OFFSET[method])
+        for _ in range(seats):
+            quotients = [Fraction(v) / (a + offset) for v, a in zip(votes, alloc)]
+            alloc[quotients.index(max(quotients))] += 1
+        return alloc
+
+    quota = Fraction(total, seats) if method == "hare" else Fraction(total // (seats + 1) + 1)
+    shares = [Fraction(v) / quota for v in votes]
+    alloc = [int(share) for share in shares]
+    left = min(max(seats - sum(alloc), 0), len(votes))
+    by_remainder = sorted(range(len(votes)), key=lambda i: -(shares[i] - alloc[i]))  # stable
+    for i in by_remainder[:left]:
+        alloc[i] += 1
+    return alloc
+
+
+def _self_check(cases: int = 2_000, seed: int = 0) -> int:
+    """python seats.py [cases] -> เทียบ allocate (ทั้งแบบ 1 ชุดและหลายชุด) กับ reference_allocate"""
+    rng = np.random.default_rng(seed)
+    failures = 0
+    for case in range(cases):
+        method = METHODS[case % len(METHODS)]
+        n_parties = int(rng.integers(1, 12))
+        seats = int(rng.integers(0, 150))
+        threshold = float(rng.choice([0.0, 0.0, 0.03, 0.05]))
+        # คะแนนเล็ก ๆ -> เจอกรณีคะแนน/เศษเท่ากันบ่อย
+        high = int(rng.choice([5, 50, 100_000]))
+        votes = [int(v) for v in rng.integers(0, high, size=n_parties)]
+
+        expected = reference_allocate(votes, seats, method, threshold)
+        got = allocate(votes, seats, method, threshold).tolist()
+        batch = allocate([votes, votes[::-1]], seats, method, threshold).tolist()
+        if got != expected or batch[0] != expected:
+            failures += 1
+            print(f"mismatch: {method} seats={seats} threshold={threshold} votes={votes} "
+                  f"expected={expected} got={got} batch={batch[0]}", file=sys.stderr)
+    print(f"{cases - failures:,}/{cases:,} cases match reference", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    if not available():
+        print("numpy is not installed (pip install numpy)", file=sys.stderr)
+        sys.exit(1)
+    sys.exit(_self_check(int(sys.argv[1]) if len(sys.argv) > 1 else 2_000))
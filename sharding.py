@@ -0,0 +1,239 @@
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Generator, Optional
+
+from sqlalchemy import MetaData, event
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.schema import CreateTable
+from sqlmodel import SQLModel, Session, create_engine, select
+
+from database import DB_PROFILE, DROPPED_INDEXES, SESSION_OPTIONS, engine, _engine_kwargs, _set_sqlite_pragmas
+from models import Voter, Ballot, ConstituencyTally, PartyTally, BallotCounter, TurnoutTally, ResultsVersion
+import tally
+
+
+# =========================
+# Sharded storage (optional)
+# =========================
+# ตั้ง SHARD_COUNT=<n> เพื่อแยก Voters / Ballots / tally ไปไว้ใน n ไฟล์ sqlite ตาม hash ของ citizen_id
+# -> แต่ละ shard มี writer lock ของตัวเอง ลงคะแนนพร้อมกันได้จริง
+# - citizen_id เดียวกันไป shard เดียวกันเสมอ -> unique index ของ shard กันลงทะเบียนซ้ำได้เอง
+#   (ไม่ต้องเช็คข้าม shard ก่อน insert ซึ่งมี race)
+# - ข้อมูลอ้างอิง (Regions / Constituencies / Parties / Candidates) อยู่ที่ DATABASE_URL (catalog) ที่เดียว
+#   ทุก shard ATTACH catalog ไว้ -> query ที่ JOIN ชื่อไทยใช้ได้เหมือนเดิมโดยไม่ต้อง copy ข้อมูล
+# - voter_id / ballot_id ของ shard i อยู่ในช่วง (i*ID_BLOCK, (i+1)*ID_BLOCK] -> รู้ shard จาก id ได้เลย
+#   (shard 0 เริ่มที่ 1 เหมือนโหมดไฟล์เดียว)
+# - ballot + tally ของ ballot ถูกเก็บใน shard ของ voter (tally ของเขตหนึ่งกระจายอยู่หลาย shard)
+# - ผลคะแนน: รวม tally ทุก shard (scatter-gather) เข้า sqlite ใน memory แล้วใช้ query เดิม
+# - Voters / Ballots ใน catalog (ข้อมูลก่อนเปิด shard) ไม่ถูกย้าย -> ถ้ามีอยู่จะไม่ยอม start
+# ใช้ได้เฉพาะ sqlite (ATTACH / sqlite_sequence) และ endpoint แบบ sync (/async/* ตอบ 503)
+
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "0"))
+SHARD_URL_TEMPLATE = os.getenv("SHARD_URL_TEMPLATE", "sqlite:///./election_shard{index}.db")
+
+ID_BLOCK = 10 ** 12  # จำนวน id ต่อ shard
+
+SHARDED_MODELS = (Voter, Ballot, ConstituencyTally, PartyTally, BallotCounter, TurnoutTally, ResultsVersion)
+TALLY_MODELS = (ConstituencyTally, PartyTally, BallotCounter, TurnoutTally)
+ID_MODELS = (Voter, Ballot)  # ตารางที่ id ต้องไม่ชนกันข้าม shard
+
+engines: list = []
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def enabled() -> bool:
+    return SHARD_COUNT > 0
+
+
+def _shard_metadata() -> MetaData:
+    # copy ทุกตาราง (FK ต้องหาตารางปลายทางเจอตอนสร้าง DDL) แต่สร้างจริงเฉพาะ SHARDED_MODELS
+    # AUTOINCREMENT -> sqlite_sequence จำค่าเริ่มต้นของช่วง id ได้แม้ตารางยังว่าง
+    metadata = MetaData()
+    for table in SQLModel.metadata.sorted_tables:
+        table.to_metadata(metadata)
+    for model in ID_MODELS:
+        metadata.tables[model.__tablename__].dialect_kwargs["sqlite_autoincrement"] = True
+    return metadata
+
+
+def _attach_catalog(dbapi_connection, connection_record) -> None:
+    # ชื่อตารางที่ไม่มีใน shard (Regions, Candidates, ...) sqlite จะไปหาใน database ที่ attach ไว้
+    dbapi_connection.execute("ATTACH DATABASE ? AS catalog", (CATALOG_PATH,))
+
+
+if enabled():
+    if engine.dialect.name != "sqlite":
+        raise ValueError("SHARD_COUNT requires a sqlite DATABASE_URL")
+    CATALOG_PATH = os.path.abspath(engine.url.database)
+
+    for _index in range(SHARD_COUNT):
+        _url = SHARD_URL_TEMPLATE.format(index=_index)
+        _engine = create_engine(_url, **_engine_kwargs(DB_PROFILE, url=_url))
+        if _engine.dialect.name != "sqlite":
+            raise ValueError("SHARD_URL_TEMPLATE must be a sqlite URL")
+        if DB_PROFILE == "production":
+            event.listen(_engine, "connect", _set_sqlite_pragmas)
+        event.listen(_engine, "connect", _attach_catalog)
+        engines.append(_engine)
+
+    _executor = ThreadPoolExecutor(max_workers=SHARD_COUNT, thread_name_prefix="shard")
+
+
+def check_catalog_empty() -> None:
+    """
+    Voters / Ballots ที่อยู่ใน catalog จะมองไม่เห็นเลยเมื่อเปิด shard (และ id ชนกับ shard 0)
+    -> ไม่ยอม start แทนการซ่อนข้อมูลเงียบ ๆ
+    """
+    with Session(engine) as session:
+        for model, id_column in ((Voter, Voter.voter_id), (Ballot, Ballot.ballot_id)):
+            if session.exec(select(id_column).limit(1)).first() is not None:
+                raise RuntimeError(
+                    f"SHARD_COUNT={SHARD_COUNT} but {engine.url.database} still has rows in "
+                    f"{model.__tablename__}; sharded mode cannot read them. "
+                    "Start with SHARD_COUNT=0, or move the data out of the catalog first."
+                )
+
+
+def create_shard_tables() -> None:
+    """เช็ค catalog + สร้างตารางใน shard ที่ยังไม่มี + ตั้งช่วง id + backfill tally (เรียกตอน start app)"""
+    check_catalog_empty()
+    metadata = _shard_metadata()
+    tables = [metadata.tables[model.__tablename__] for model in SHARDED_MODELS]
+
+    for index, shard_engine in enumerate(engines):
+        metadata.create_all(shard_engine, tables=tables)
+        with shard_engine.begin() as conn:
+            for model in SHARDED_MODELS:
+                for name in DROPPED_INDEXES.get(model.__tablename__, ()):
+                    conn.exec_driver_sql(f'DROP INDEX IF EXISTS "{name}"')
+            for model in ID_MODELS:
+                conn.exec_driver_sql(
+                    "INSERT INTO sqlite_sequence (name, seq) SELECT ?, ? "
+                    "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = ?)",
+                    (model.__tablename__, id_base(index), model.__tablename__),
+                )
+        with Session(shard_engine) as session:
+            tally.ensure_tallies(session)
+
+
+# =========================
+# Routing
+# =========================
+
+def data_engines() -> list:
+    """engine ที่เก็บ Voters / Ballots (โหมดไฟล์เดียว = [engine])"""
+    return engines if enabled() else [engine]
+
+
+def id_base(index: int) -> int:
+    return index * ID_BLOCK
+
+
+def shard_of_citizen(citizen_id: str) -> int:
+    # crc32 ไม่ขึ้นกับ process (hash() ของ str สุ่มใหม่ทุกครั้งที่ start)
+    return zlib.crc32(citizen_id.encode("utf-8")) % SHARD_COUNT if enabled() else 0
+
+
+def shard_of_id(row_id: int) -> Optional[int]:
+    """voter_id / ballot_id -> index ของ shard (id นอกช่วง -> None)"""
+    if not enabled():
+        return 0
+    index = (row_id - 1) // ID_BLOCK
+    return index if 0 <= index < SHARD_COUNT else None
+
+
+def session_for_citizen(citizen_id: str) -> Session:
+    return Session(data_engines()[shard_of_citizen(citizen_id)], **SESSION_OPTIONS)
+
+
+@contextmanager
+def session_for_id(row_id: int, default: Session) -> Generator[Optional[Session], None, None]:
+    """
+    session ของ shard ที่เก็บ voter/ballot นี้
+    โหมดไฟล์เดียว -> default (session ของ request) / id ไม่อยู่ใน shard ไหน -> None
+    """
+    if not enabled():
+        yield default
+        return
+    index = shard_of_id(row_id)
+    if index is None:
+        yield None
+        return
+    with Session(engines[index], **SESSION_OPTIONS) as session:
+        yield session
+
+
+def run_on(tasks: dict) -> dict:
+    """tasks = {shard index: fn(session)} -> รันทุก shard พร้อมกัน คืน {shard index: ผลลัพธ์}"""
+    def run(index: int, fn: Callable):
+        with Session(data_engines()[index], **SESSION_OPTIONS) as session:
+            return fn(session)
+
+    if not enabled() or len(tasks) == 1:
+        return {index: run(index, fn) for index, fn in tasks.items()}
+
+    futures = {index: _executor.submit(run, index, fn) for index, fn in tasks.items()}
+    return {index: future.result() for index, future in futures.items()}
+
+
+def scatter(fn: Callable) -> list:
+    """รัน fn(session) กับทุก shard พร้อมกัน คืน list ตามลำดับ shard"""
+    results = run_on({index: fn for index in range(len(data_engines()))})
+    return [results[index] for index in sorted(results)]
+
+
+# =========================
+# Results (scatter-gather)
+# =========================
+
+def _gather_tallies() -> dict:
+    """อ่าน tally ทุก shard แล้วรวมยอดตาม primary key -> {model: [(pk..., value), ...]}"""
+    def read(session: Session) -> dict:
+        return {model: session.exec(select(*model.__table__.columns)).all() for model in TALLY_MODELS}
+
+    merged = {}
+    for model in TALLY_MODELS:
+        key_width = len(model.__table__.primary_key.columns)
+        totals: dict = {}
+        for shard_rows in scatter(read):
+            for row in shard_rows[model]:
+                key = tuple(row[:key_width])
+                totals[key] = totals.get(key, 0) + row[key_width]
+        merged[model] = [key + (value,) for key, value in totals.items()]
+    return merged
+
+
+def _populate_merged(dbapi_connection, connection_record) -> None:
+    # sqlite ใน memory: tally ที่รวมแล้ว + ATTACH catalog สำหรับ JOIN ชื่อ
+    _attach_catalog(dbapi_connection, connection_record)
+    dialect = engine.dialect
+    for model, rows in _gather_tallies().items():
+        table = model.__table__
+        dbapi_connection.execute(str(CreateTable(table, include_foreign_key_constraints=[]).compile(dialect=dialect)))
+        columns = ", ".join(f'"{c.name}"' for c in table.columns)
+        placeholders = ", ".join("?" for _ in table.columns)
+        dbapi_connection.executemany(f'INSERT INTO "{table.name}" ({columns}) VALUES ({placeholders})', rows)
+    dbapi_connection.commit()
+
+
+def get_results_session() -> Generator[Session, None, None]:
+    """
+    Dependency ของ endpoint ผลคะแนน / นับบัตร / turnout
+    โหมด shard: tally ถูกรวมตอน query แรกเท่านั้น (response ที่ cache ไว้ / 304 อ่านแค่แถว version ของแต่ละ shard)
+    """
+    if not enabled():
+        with Session(engine) as session:
+            yield session
+        return
+
+    merged = create_engine(
+        "sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False},
+    )
+    event.listen(merged, "connect", _populate_merged)
+    try:
+        with Session(merged) as session:
+            yield session
+    finally:
+        merged.dispose()
@@ -0,0 +1,103 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from sqlalchemy import event
+
+
+# =========================
+# Slow-query log (opt-in)
+# =========================
+# ตั้ง SLOW_QUERY_MS=<ms> เพื่อเปิด: statement ที่ช้ากว่านี้จะถูก log พร้อม EXPLAIN QUERY PLAN
+# เก็บล่าสุดไว้ใน ring buffer ขนาด SLOW_QUERY_LOG_SIZE (ดูผ่าน GET /admin/slow-queries)
+
+SLOW_QUERY_MS = os.getenv("SLOW_QUERY_MS")
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", "100"))
+MAX_PARAMS_REPR = 500
+
+logger = logging.getLogger("election.slowquery")
+
+_entries: deque = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return SLOW_QUERY_MS is not None
+
+
+def entries() -> list:
+    """ใหม่สุดก่อน"""
+    with _lock:
+        return list(reversed(_entries))
+
+
+def clear() -> None:
+    with _lock:
+        _entries.clear()
+
+
+def _explain(conn, statement: str, parameters) -> list | None:
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        prefix = "EXPLAIN QUERY PLAN "
+    elif dialect == "postgresql":
+        prefix = "EXPLAIN "
+    else:
+        return None
+
+    # explain เฉพาะ query อ่าน (EXPLAIN กับ INSERT/UPDATE บาง driver จะรันจริง)
+    if not statement.lstrip().upper().startswith(("SELECT", "WITH")):
+        return None
+
+    # ใช้ DBAPI cursor ตรง ๆ -> ไม่วนกลับเข้า engine events
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters or ())
+        # sqlite: (id, parent, notused, detail) / postgres: (line,) -> ใช้คอลัมน์สุดท้าย
+        return [str(row[-1]) for row in cursor.fetchall()]
+    except Exception as e:  # plan เป็นข้อมูลเสริม ห้ามทำให้ request พัง
+        return [f"EXPLAIN failed: {e}"]
+    finally:
+        cursor.close()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("slowlog_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed_ms = (time.perf_counter() - conn.info["slowlog_query_start"].pop()) * 1000
+    if elapsed_ms < float(SLOW_QUERY_MS):
+        return
+
+    # executemany: explain ด้วยชุด parameter แรก
+    first_params = parameters[0] if executemany and parameters else parameters
+    params_repr = repr(parameters)
+    if len(params_repr) > MAX_PARAMS_REPR:
+        params_repr = params_repr[:MAX_PARAMS_REPR] + "..."
+
+    entry = {
+        "at": datetime.now(timezone.utc).isoformat(),
+        "duration_ms": round(elapsed_ms, 3),
+        "statement": statement,
+        "parameters": params_repr,
+        "executemany": executemany,
+        "plan": _explain(conn, statement, first_params),
+    }
+    with _lock:
+        _entries.append(entry)
+
+    logger.warning(
+        "slow query %.1f ms: %s | params=%s | plan=%s",
+        elapsed_ms, " ".join(statement.split()), params_repr, entry["plan"],
+    )
+
+
+def instrument_engine(engine) -> None:
+    if not enabled():
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
@@ -0,0 +1,257 @@
+from collections import Counter
+from typing import Iterable, Mapping
+
+from sqlalchemy import delete, insert, literal, update
+from sqlmodel import Session, select, func, case
+
+from models import Ballot, Voter, ConstituencyTally, PartyTally, BallotCounter, TurnoutTally, ResultsVersion
+
+VOTE_TYPES = ("Constituency", "PartyList")
+
+# vote_type -> flag การใช้สิทธิบน Voter
+VOTED_FLAGS = {"Constituency": "has_voted_const", "PartyList": "has_voted_list"}
+
+RESULTS_VERSION_KEY = "results"
+VOTERS_VERSION_KEY = "voters"  # จำนวน voter ที่เคย insert (citizen_filter ใช้ตรวจว่า filter ตามทัน)
+
+
+# =========================
+# Record (เรียกใน transaction เดียวกับการ add ballot)
+# =========================
+
+def record_ballots(session: Session, ballots: Iterable[Ballot], voters: Mapping[int, Voter]) -> tuple:
+    """
+    บวกคะแนนบัตรดีเข้า tally table + นับบัตรทุกใบเข้า BallotCounters
+    + นับผู้มาใช้สิทธิเข้า TurnoutTallies (ยังไม่ commit)
+    voters = {voter_id: Voter} ของ ballot ทุกใบ (turnout นับตามเขตของ voter)
+    ballot ที่ส่งมาต้องผ่าน _judge_ballot แล้ว: vote_type ที่รู้จัก = flag เพิ่งเปลี่ยนจาก 0 เป็น 1
+    รวมยอดต่อ key ก่อน -> batch ใหญ่ก็ยิง upsert แค่ครั้งเดียวต่อ key
+    คืน (const_counts, party_counts) = คะแนนที่เพิ่มต่อ (const_id, candidate_id/party_id)
+    """
+    const_counts: Counter = Counter()
+    party_counts: Counter = Counter()
+    ballot_counts: Counter = Counter()
+    turnout_counts: Counter = Counter()
+
+    for b in ballots:
+        vote_type = b.vote_type if b.vote_type in VOTE_TYPES else "Other"
+        ballot_counts[(vote_type, bool(b.is_valid))] += 1
+        if vote_type != "Other":
+            turnout_counts[(voters[b.voter_id].const_id, vote_type)] += 1
+
+        if not b.is_valid:
+            continue
+        if b.vote_type == "Constituency":
+            const_counts[(b.const_id, b.candidate_id)] += 1
+        elif b.vote_type == "PartyList":
+            party_counts[(b.const_id, b.party_id)] += 1
+
+    # key เรียงลำดับเสมอ -> transaction ที่มาพร้อมกันล็อกแถว tally ตามลำดับเดียวกัน (ไม่ deadlock)
+    _bump_many(session, ConstituencyTally, "votes", ("const_id", "candidate_id"), const_counts)
+    _bump_many(session, PartyTally, "votes", ("const_id", "party_id"), party_counts)
+    _bump_many(session, BallotCounter, "ballots", ("vote_type", "is_valid"), ballot_counts)
+    _bump_many(session, TurnoutTally, "voters", ("const_id", "vote_type"), turnout_counts)
+    if ballot_counts:
+        bump_version(session)
+
+    return const_counts, party_counts
+
+
+def record_turnout_change(session: Session, const_id: int, vote_type: str, delta: int) -> None:
+    """แก้สถานะการใช้สิทธิด้วยมือ (PUT /voters/{id}/status) -> ปรับ turnout ตาม (ยังไม่ commit)"""
+    if delta:
+        _bump_many(session, TurnoutTally, "voters", ("const_id", "vote_type"), {(const_id, vote_type): delta})
+        bump_version(session)
+
+
+def bump_version(session: Session) -> None:
+    """
+    เพิ่ม ResultsVersions ใน transaction ปัจจุบัน (ยังไม่ commit)
+    เรียกทุกครั้งที่ผลคะแนน / turnout / ข้อมูลอ้างอิงเปลี่ยน -> respcache / live feed รู้ว่าต้องอ่านใหม่
+    """
+    _bump_many(session, ResultsVersion, "version", ("name",), {(RESULTS_VERSION_KEY,): 1})
+
+
+def results_version(session: Session) -> int:
+    return _read_version(session, RESULTS_VERSION_KEY)
+
+
+def bump_voters_version(session: Session, inserted: int) -> None:
+    """เพิ่มตัวนับ voter ตามจำนวนแถวที่ insert ใน transaction ปัจจุบัน (ยังไม่ commit)"""
+    if inserted:
+        _bump_many(session, ResultsVersion, "version", ("name",), {(VOTERS_VERSION_KEY,): inserted})
+
+
+def voters_version(session: Session) -> int:
+    return _read_version(session, VOTERS_VERSION_KEY)
+
+
+def _read_version(session: Session, key: str) -> int:
+    version = session.exec(
+        select(ResultsVersion.version).where(ResultsVersion.name == key)
+    ).first()
+    return version or 0
+
+
+UPSERT_CHUNK = 500  # จำนวนแถวต่อ INSERT ... VALUES (...), (...) หนึ่งคำสั่ง
+
+
+def _upsert_insert(session: Session):
+    """insert ที่มี on_conflict_do_update ของ dialect นี้ (ไม่รองรับ -> None)"""
+    dialect = session.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as upsert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as upsert
+    else:
+        return None
+    return upsert
+
+
+def _bump_many(session: Session, model, column: str, key_columns: tuple, counts: Mapping) -> None:
+    """
+    บวก counts = {key tuple: n} เข้า model.column
+    INSERT ... ON CONFLICT (pk) DO UPDATE SET column = column + excluded.column
+    -> แถวใหม่ที่ถูกเพิ่มพร้อมกันจากหลาย transaction ไม่ชน unique (postgres READ COMMITTED)
+    """
+    keys = sorted(counts)
+    if not keys:
+        return
+
+    upsert = _upsert_insert(session)
+    if upsert is None:
+        for key in keys:
+            _bump(session, model, column, counts[key], **dict(zip(key_columns, key)))
+        return
+
+    for i in range(0, len(keys), UPSERT_CHUNK):
+        rows = [{**dict(zip(key_columns, key)), column: counts[key]} for key in keys[i:i + UPSERT_CHUNK]]
+        statement = upsert(model).values(rows)
+        session.execute(
+            statement.on_conflict_do_update(
+                index_elements=list(key_columns),
+                set_={column: getattr(model, column) + statement.excluded[column]},
+            )
+        )
+
+
+def _bump(session: Session, model, column: str, n: int, **key) -> None:
+    # dialect ที่ไม่มี ON CONFLICT: UPDATE ก่อน ไม่มีแถว -> insert (ปลอดภัยเมื่อ writer ถูก serialize)
+    statement = (
+        update(model)
+        .where(*[getattr(model, k) == v for k, v in key.items()])
+        .values({column: getattr(model, column) + n})
+        .execution_options(synchronize_session=False)
+    )
+    if session.execute(statement).rowcount == 0:
+        session.add(model(**key, **{column: n}))
+
+
+# =========================
+# Rebuild / Backfill
+# =========================
+
+def rebuild_tallies(session: Session) -> None:
+    """
+    คำนวณ tally ใหม่ทั้งหมดจาก Ballots (full scan ครั้งเดียว)
+    ใช้ตอน migrate election.db เก่า หรือถ้าสงสัยว่าตัวนับเพี้ยน
+    """
+    session.execute(delete(ConstituencyTally))
+    session.execute(delete(PartyTally))
+    session.execute(delete(BallotCounter))
+
+    session.execute(
+        insert(ConstituencyTally).from_select(
+            ["const_id", "candidate_id", "votes"],
+            select(Ballot.const_id, Ballot.candidate_id, func.count(Ballot.ballot_id))
+            .where(Ballot.vote_type == "Constituency", Ballot.is_valid == True)
+            .group_by(Ballot.const_id, Ballot.candidate_id),
+        )
+    )
+    session.execute(
+        insert(PartyTally).from_select(
+            ["const_id", "party_id", "votes"],
+            select(Ballot.const_id, Ballot.party_id, func.count(Ballot.ballot_id))
+            .where(Ballot.vote_type == "PartyList", Ballot.is_valid == True)
+            .group_by(Ballot.const_id, Ballot.party_id),
+        )
+    )
+
+    vote_type = case(
+        (Ballot.vote_type.in_(VOTE_TYPES), Ballot.vote_type),
+        else_="Other",
+    )
+    session.execute(
+        insert(BallotCounter).from_select(
+            ["vote_type", "is_valid", "ballots"],
+            select(vote_type, Ballot.is_valid, func.count(Ballot.ballot_id))
+            .group_by(vote_type, Ballot.is_valid),
+        )
+    )
+    _rebuild_turnout(session)
+    bump_version(session)
+    session.commit()
+
+
+def rebuild_turnout(session: Session) -> None:
+    """คำนวณ TurnoutTallies ใหม่จาก flag has_voted_* ของ Voters"""
+    _rebuild_turnout(session)
+    bump_version(session)
+    session.commit()
+
+
+def _rebuild_turnout(session: Session) -> None:
+    session.execute(delete(TurnoutTally))
+    for vote_type, flag in VOTED_FLAGS.items():
+        column = getattr(Voter, flag)
+        session.execute(
+            insert(TurnoutTally).from_select(
+                ["const_id", "vote_type", "voters"],
+                select(Voter.const_id, literal(vote_type), func.count(Voter.voter_id))
+                .where(column != 0)
+                .group_by(Voter.const_id),
+            )
+        )
+
+
+def ensure_tallies(session: Session) -> None:
+    """
+    เรียกตอน start app: ถ้ามี ballot อยู่แล้วแต่ตัวนับยังว่าง (db ก่อนมีตาราง tally) -> backfill
+    ทุก ballot ถูกนับเข้า BallotCounters เสมอ จึงใช้ตารางนี้ตัวเดียวเช็คได้
+    """
+    has_counter = session.exec(select(BallotCounter.vote_type).limit(1)).first() is not None
+    if not has_counter:
+        has_ballot = session.exec(select(Ballot.ballot_id).limit(1)).first() is not None
+        if has_ballot:
+            rebuild_tallies(session)
+            return
+
+    # db ที่มี tally แล้วแต่ก่อนมี TurnoutTallies -> backfill จาก flag ของ Voters
+    has_turnout = session.exec(select(TurnoutTally.const_id).limit(1)).first() is not None
+    if not has_turnout:
+        has_voted = session.exec(
+            select(Voter.voter_id).where((Voter.has_voted_const != 0) | (Voter.has_voted_list != 0)).limit(1)
+        ).first() is not None
+        if has_voted:
+            rebuild_turnout(session)
+
+
+# =========================
+# Read
+# =========================
+
+def ballot_counts(session: Session) -> dict:
+    """
+    อ่านตัวนับบัตรทั้งหมดใน SELECT เดียว (snapshot เดียวกัน -> ยอดรวมกับยอดย่อยไม่มีทางขัดกัน)
+    คืนค่า {(vote_type, is_valid): ballots}
+    """
+    rows = session.exec(
+        select(BallotCounter.vote_type, BallotCounter.is_valid, BallotCounter.ballots)
+    ).all()
+    return {(r.vote_type, bool(r.is_valid)): r.ballots for r in rows}
+
+
+def turnout_counts(session: Session) -> dict:
+    """คืนค่า {(const_id, vote_type): voters}"""
+    rows = session.exec(select(TurnoutTally.const_id, TurnoutTally.vote_type, TurnoutTally.voters)).all()
+    return {(r.const_id, r.vote_type): r.voters for r in rows}
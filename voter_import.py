@@ -0,0 +1,275 @@
+"""
+นำเข้าทะเบียนผู้มีสิทธิจาก CSV ทีละมาก ๆ (citizen_id, full_name, const_id)
+
+    python voter_import.py roll.csv
+    python voter_import.py roll.csv --chunk-size 20000
+
+อ่านไฟล์แบบ stream ทีละ chunk -> ตรวจเขตกับ set ใน memory -> ตัด citizen_id ซ้ำภายใน chunk
+-> insert ... ON CONFLICT (citizen_id) DO NOTHING (postgresql ใช้ COPY) แล้ว commit ครั้งเดียวต่อ chunk
+memory คงที่ตามขนาด chunk (ไม่จำ citizen_id ทั้งไฟล์) -> ซ้ำข้าม chunk ให้ unique index จัดการ
+"""
+import argparse
+import csv
+import io
+import sys
+import time
+from contextlib import ExitStack
+from typing import Callable, Iterable, Optional, TextIO
+
+from sqlalchemy import insert
+from sqlmodel import Session, select
+
+from models import Voter
+from tally import _upsert_insert
+import refcache
+import sharding
+import tally
+
+
+DEFAULT_CHUNK_SIZE = 10_000
+EXISTING_LOOKUP_CHUNK = 500  # จำนวน parameter ใน IN (...) ต่อ query
+MAX_ERROR_SAMPLES = 20
+
+HEADER = ["citizen_id", "full_name", "const_id"]
+COPY_COLUMNS = ("citizen_id", "full_name", "const_id", "has_voted_const", "has_voted_list")
+COPY_STAGE_TABLE = "voter_import_stage"
+
+
+def _new_stats() -> dict:
+    return {
+        "rows_read": 0,
+        "inserted": 0,
+        "duplicate_in_file": 0,
+        "already_registered": 0,
+        "unknown_constituency": 0,
+        "malformed": 0,
+        "errors": [],  # ตัวอย่างแถวที่ข้าม (ไม่เกิน MAX_ERROR_SAMPLES)
+    }
+
+
+def _skip(stats: dict, kind: str, line_no: int, detail: str) -> None:
+    stats[kind] += 1
+    if len(stats["errors"]) < MAX_ERROR_SAMPLES:
+        stats["errors"].append({"line": line_no, "reason": kind, "detail": detail})
+
+
+def _existing_citizen_ids(session: Session, citizen_ids: list) -> set:
+    found = set()
+    for i in range(0, len(citizen_ids), EXISTING_LOOKUP_CHUNK):
+        chunk = citizen_ids[i:i + EXISTING_LOOKUP_CHUNK]
+        found.update(session.exec(select(Voter.citizen_id).where(Voter.citizen_id.in_(chunk))))
+    return found
+
+
+def _copy_rows(session: Session, rows: list) -> Optional[list]:
+    """
+    postgresql: COPY ... FROM STDIN (เร็วกว่า INSERT หลายเท่า) ใน transaction เดียวกับ session
+    COPY ไม่มี ON CONFLICT -> COPY ลงตารางพัก (temp) แล้ว INSERT ... SELECT ... ON CONFLICT DO NOTHING
+    คืน citizen_id ที่ insert ได้จริง / driver ไม่รองรับ COPY -> None
+    """
+    connection = session.connection()
+    table = connection.dialect.identifier_preparer.quote(Voter.__tablename__)
+    columns = ", ".join(COPY_COLUMNS)
+    cursor = connection.connection.dbapi_connection.cursor()
+    try:
+        if not hasattr(cursor, "copy") and not hasattr(cursor, "copy_expert"):
+            return None
+
+        # temp table อยู่กับ connection (ใช้ซ้ำได้ใน pool) แถวถูกล้างทุก commit
+        cursor.execute(
+            f"CREATE TEMP TABLE IF NOT EXISTS {COPY_STAGE_TABLE} ("
+            "citizen_id text, full_name text, const_id integer, has_voted_const integer, has_voted_list integer"
+            ") ON COMMIT DELETE ROWS"
+        )
+        if hasattr(cursor, "copy"):  # psycopg 3
+            with cursor.copy(f"COPY {COPY_STAGE_TABLE} ({columns}) FROM STDIN") as copy:
+                for row in rows:
+                    copy.write_row([row[c] for c in COPY_COLUMNS])
+        else:  # psycopg2
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows([row[c] for c in COPY_COLUMNS] for row in rows)
+            buffer.seek(0)
+            cursor.copy_expert(f"COPY {COPY_STAGE_TABLE} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+        cursor.execute(
+            f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {COPY_STAGE_TABLE} "
+            "ON CONFLICT (citizen_id) DO NOTHING RETURNING citizen_id"
+        )
+        return [r[0] for r in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
+def _insert_rows(session: Session, rows: list) -> list:
+    """
+    insert โดยข้าม citizen_id ที่ลงทะเบียนไว้แล้ว (รวมถึงที่ POST /voters เพิ่มเข้ามาพร้อมกัน)
+    คืน citizen_id ที่ insert ได้จริง
+    """
+    if session.connection().dialect.name == "postgresql":
+        inserted = _copy_rows(session, rows)
+        if inserted is not None:
+            return inserted
+
+    upsert = _upsert_insert(session)
+    if upsert is None:
+        # dialect ที่ไม่มี ON CONFLICT: เช็คก่อนแล้ว insert (มี race กับ POST /voters ที่มาพร้อมกัน)
+        existing = _existing_citizen_ids(session, [row["citizen_id"] for row in rows])
+        rows = [row for row in rows if row["citizen_id"] not in existing]
+        if rows:
+            session.execute(insert(Voter), rows)  # executemany
+        return [row["citizen_id"] for row in rows]
+
+    statement = upsert(Voter).on_conflict_do_nothing(index_elements=["citizen_id"]).returning(Voter.citizen_id)
+    return session.execute(statement, rows).scalars().all()
+
+
+def _flush_chunk(sessions: list, pending: dict, stats: dict, on_inserted=None) -> None:
+    """
+    pending = {citizen_id: (line_no, row)} ของ chunk นี้ (ไม่ซ้ำกันเองแล้ว)
+    on_inserted(citizen_ids) ถูกเรียกหลัง commit ของแต่ละ session ด้วย citizen_id ที่ insert ได้จริง
+    """
+    if not pending:
+        return
+
+    items_by_shard: dict = {}
+    for citizen_id, item in pending.items():
+        items_by_shard.setdefault(sharding.shard_of_citizen(citizen_id), []).append(item)
+
+    inserted_by_shard: dict = {}
+    for index, items in items_by_shard.items():
+        inserted = set(_insert_rows(sessions[index], [row for _, row in items]))
+        tally.bump_voters_version(sessions[index], len(inserted))
+        inserted_by_shard[index] = inserted
+        stats["inserted"] += len(inserted)
+        # ไม่ถูก insert = มีในทะเบียนแล้ว (หรือซ้ำกับ chunk ก่อนหน้าในไฟล์เดียวกัน)
+        for line_no, row in items:
+            if row["citizen_id"] not in inserted:
+                _skip(stats, "already_registered", line_no, row["citizen_id"])
+    for index, session in enumerate(sessions):
+        session.commit()
+        if on_inserted and inserted_by_shard.get(index):
+            on_inserted(inserted_by_shard[index])
+
+
+def import_voters(
+    session: Session,
+    lines: Iterable[str],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    progress: Optional[Callable[[dict], None]] = None,
+    shard_sessions: Optional[list] = None,
+    on_inserted: Optional[Callable[[Iterable[str]], None]] = None,
+) -> dict:
+    """
+    lines = iterable ของบรรทัด CSV (เช่น file object ที่เปิดแบบ text)
+    แถวแรกเป็น header citizen_id,full_name,const_id หรือไม่มีก็ได้
+    commit ทุก chunk_size แถว -> import ค้างกลางทาง ส่วนที่ commit แล้วยังอยู่
+    citizen_id ซ้ำภายใน chunk = duplicate_in_file / ซ้ำข้าม chunk หรือมีในทะเบียนแล้ว = already_registered
+    shard_sessions = session ของทุก shard ตามลำดับ (โหมด shard) / None = ใช้ session
+    on_inserted = callback รับ citizen_id ที่ commit แล้วทีละ chunk (เช่น citizen_filter.add_many)
+    """
+    sessions = shard_sessions or [session]
+    stats = _new_stats()
+    valid_consts = set(refcache.get(session).constituencies)
+    pending: dict = {}  # citizen_id -> (line_no, row) ของ chunk ปัจจุบัน
+
+    for line_no, record in enumerate(csv.reader(lines), start=1):
+        if not record or all(not c.strip() for c in record):
+            continue
+        if line_no == 1 and [c.strip().lower() for c in record] == HEADER:
+            continue
+
+        stats["rows_read"] += 1
+
+        if len(record) != 3:
+            _skip(stats, "malformed", line_no, f"expected 3 columns, got {len(record)}")
+            continue
+
+        citizen_id, full_name, const_raw = (c.strip() for c in record)
+        if not citizen_id or not full_name:
+            _skip(stats, "malformed", line_no, "empty citizen_id or full_name")
+            continue
+        try:
+            const_id = int(const_raw)
+        except ValueError:
+            _skip(stats, "malformed", line_no, f"const_id {const_raw!r} is not an integer")
+            continue
+
+        if const_id not in valid_consts:
+            _skip(stats, "unknown_constituency", line_no, str(const_id))
+            continue
+        if citizen_id in pending:
+            _skip(stats, "duplicate_in_file", line_no, citizen_id)
+            continue
+
+        pending[citizen_id] = (line_no, {
+            "citizen_id": citizen_id,
+            "full_name": full_name,
+            "const_id": const_id,
+            "has_voted_const": 0,
+            "has_voted_list": 0,
+        })
+
+        if len(pending) >= chunk_size:
+            _flush_chunk(sessions, pending, stats, on_inserted)
+            pending = {}
+            if progress:
+                progress(stats)
+
+    _flush_chunk(sessions, pending, stats, on_inserted)
+    if progress:
+        progress(stats)
+
+    return stats
+
+
+def import_voters_file(f: TextIO, chunk_size: int = DEFAULT_CHUNK_SIZE, progress=None, on_inserted=None) -> dict:
+    """เปิด session ของตัวเอง (ใช้จาก CLI / thread ของ endpoint)"""
+    from database import engine
+
+    with Session(engine) as session, ExitStack() as stack:
+        shard_sessions = [stack.enter_context(Session(e)) for e in sharding.engines]
+        return import_voters(
+            session, f, chunk_size=chunk_size, progress=progress, shard_sessions=shard_sessions or None,
+            on_inserted=on_inserted,
+        )
+
+
+# =========================
+# CLI
+# =========================
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk import voters from CSV (citizen_id, full_name, const_id)")
+    parser.add_argument("csv_path")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    from database import create_db_and_tables
+    create_db_and_tables()
+    if sharding.enabled():
+        sharding.create_shard_tables()
+
+    start = time.perf_counter()
+
+    def progress(stats: dict) -> None:
+        elapsed = time.perf_counter() - start
+        rate = stats["inserted"] / elapsed if elapsed else 0.0
+        print(
+            f"read {stats['rows_read']:,}  inserted {stats['inserted']:,}  "
+            f"skipped {stats['rows_read'] - stats['inserted']:,}  ({rate:,.0f} rows/s)",
+            file=sys.stderr,
+        )
+
+    with open(args.csv_path, encoding="utf-8-sig", newline="") as f:
+        stats = import_voters_file(f, chunk_size=args.chunk_size, progress=progress)
+
+    for key in ("duplicate_in_file", "already_registered", "unknown_constituency", "malformed"):
+        if stats[key]:
+            print(f"{key}: {stats[key]:,}", file=sys.stderr)
+    for err in stats["errors"]:
+        print(f"  line {err['line']}: {err['reason']} ({err['detail']})", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())